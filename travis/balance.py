@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+"""Mass and charge balance of the reactions
+
+Parses every !Formula of the Compound table once into a sparse element-count matrix (elements x metabolites)
+and multiplies it by the stoichiometric matrix, giving the net amount of every element made by every reaction
+in one operation. The charges are a vector multiplied the same way. A balanced reaction has a column of zeros.
+
+Left out of the checks:
+    - boundary reactions (exchanges, sinks...), which have an empty side by design
+    - reactions with a compound whose formula is unknown, empty or polymeric ("(C5H8)n"), or with a metabolite
+      missing from the Compound table, for mass balance
+    - reactions with a compound without a numeric charge, for charge balance
+Generic groups such as R and X count as elements, so they have to balance like any other.
+
+Usage:
+    python travis/balance.py
+    python travis/balance.py curation --elements C H O N P S --show 0
+    python travis/balance.py --json balance.json                      record the current imbalances
+    python travis/balance.py --baseline balance.json                  fail only on new imbalances, as a pre-build gate
+"""
+import argparse
+import json
+import re
+from functools import lru_cache
+
+import numpy as np
+from scipy import sparse
+
+ELEMENT = re.compile(r"([A-Z][a-z]*|\(|\))(\d*)")
+TOLERANCE = 1e-6
+
+
+@lru_cache(maxsize=None)
+def parse_formula(formula):
+    """Function to count the atoms of a chemical formula such as "C6H12O6", "(C4H6N2O2SR2)2" or "CaCl2.2H2O"
+
+    Results are cached, as the same compound is usually in several compartments, and must not be modified.
+
+        Arguments:
+            formula {str} -- chemical formula, with integer counts, groups in brackets and "." between parts
+
+        Raises:
+            ValueError -- if the formula is empty, polymeric ("(C5H8)n") or otherwise not a formula
+
+        Returns:
+            dict -- element:number of atoms
+    """
+    counts = {}
+    for part in formula.strip().split("."):
+        match = re.match(r"\d+",part) #leading multiplier of the part, e.g. water of crystallisation
+        multiplier = int(match.group(0)) if match else 1
+        part = part[match.end():] if match else part
+        stack = [{}]
+        position = 0
+        for token in ELEMENT.finditer(part):
+            if token.start() != position:
+                break
+            position = token.end()
+            name,number = token.groups()
+            number = int(number) if number else 1
+            if name == "(":
+                stack.append({})
+            elif name == ")":
+                if len(stack) == 1:
+                    raise ValueError("Unbalanced brackets in formula "+repr(formula))
+                group = stack.pop()
+                for element,count in group.items():
+                    stack[-1][element] = stack[-1].get(element,0)+count*number
+            else:
+                stack[-1][name] = stack[-1].get(name,0)+number
+        if position != len(part) or len(stack) != 1 or not stack[0]:
+            raise ValueError("Cannot parse formula "+repr(formula))
+        for element,count in stack[0].items():
+            counts[element] = counts.get(element,0)+count*multiplier
+    return counts
+
+
+class Balance():
+    """Mass and charge balance of every reaction of a ModelSystem
+
+        Arguments:
+            model {ModelSystem} -- model with the Reaction and Compound tables loaded
+
+    instance.elements = numpy array of the elements, the rows of instance.mass\n
+    instance.mass = dense matrix (elements x reactions) of the net atoms made by every reaction\n
+    instance.charge = array of the net charge made by every reaction\n
+    instance.mass_checked, instance.charge_checked = boolean arrays of the reactions whose balance is known\n
+    instance.unparsed = dictionary of compound:formula for formulas that could not be parsed
+    """
+
+    def __init__(self,model):
+        """Builds the element matrix and charge vector, and multiplies them by the stoichiometric matrix"""
+        stoichiometry = model.stoichiometry
+        self.reactions = stoichiometry.reactions
+        compounds = model.tables.get("Compound")
+        headers = compounds.headers
+        formulas = compounds.column("!Formula") if "!Formula" in headers else {}
+        charges = compounds.column("!Charge") if "!Charge" in headers else {}
+        n_metabolites = len(stoichiometry.metabolites)
+
+        element_index = {}
+        rows = []
+        cols = []
+        values = []
+        known_formula = np.zeros(n_metabolites,dtype=bool)
+        known_charge = np.zeros(n_metabolites,dtype=bool)
+        charge = np.zeros(n_metabolites)
+        self.unparsed = {}
+        for met,i in stoichiometry.metabolite_index.items():
+            formula = formulas.get(met,"")
+            if formula.strip() != "":
+                try:
+                    counts = parse_formula(formula)
+                except ValueError:
+                    self.unparsed[met] = formula
+                else:
+                    known_formula[i] = True
+                    for element,count in counts.items():
+                        rows.append(element_index.setdefault(element,len(element_index)))
+                        cols.append(i)
+                        values.append(count)
+            try:
+                charge[i] = float(charges.get(met,""))
+                known_charge[i] = True
+            except ValueError:
+                pass
+        self.elements = np.array(list(element_index),dtype=object)
+        elements = sparse.csr_matrix((np.array(values,dtype=float),(np.array(rows,dtype=np.int32),np.array(cols,dtype=np.int32))),shape=(len(self.elements),n_metabolites))
+
+        matrix = stoichiometry.matrix
+        used = abs(matrix).T #reactions x metabolites, non-zero where a metabolite takes part
+        boundary = np.array([not reactants or not products or "" in reactants or "" in products for reactants,products in model.index.reaction_formulas.values()])
+        invalid = np.zeros(len(self.reactions),dtype=bool)
+        for rxn,met,coefficient in stoichiometry.invalid: #a coefficient left out of the matrix would fake an imbalance
+            invalid[stoichiometry.reaction_index[rxn]] = True
+        self.mass_checked = ~boundary & ~invalid & (used @ (~known_formula).astype(float) == 0)
+        self.charge_checked = ~boundary & ~invalid & (used @ (~known_charge).astype(float) == 0)
+        self.mass = (elements @ matrix).toarray()
+        self.charge = matrix.T @ charge
+
+    def mass_imbalanced(self,elements=None):
+        """Function to get the mass imbalanced reactions
+
+            Keyword Arguments:
+                elements {list} -- elements to check, defaults to all of them (default: {None})
+
+            Returns:
+                dict -- reaction:dictionary of element:net atoms made, for the elements that do not balance
+        """
+        rows = np.arange(len(self.elements)) if elements is None else np.flatnonzero(np.isin(self.elements,list(elements)))
+        mass = self.mass[rows]
+        imbalanced = self.mass_checked & (np.abs(mass) > TOLERANCE).any(axis=0)
+        return {self.reactions[j]:{self.elements[i]:float(mass[k,j]) for k,i in enumerate(rows) if abs(mass[k,j]) > TOLERANCE} for j in np.flatnonzero(imbalanced)}
+
+    def charge_imbalanced(self):
+        """Function to get the charge imbalanced reactions, as a dictionary of reaction:net charge made"""
+        imbalanced = self.charge_checked & (np.abs(self.charge) > TOLERANCE)
+        return {self.reactions[j]:float(self.charge[j]) for j in np.flatnonzero(imbalanced)}
+
+
+def format_imbalance(counts):
+    """Function to write element:net atoms as a string such as "H-1 O+2" """
+    return " ".join("%s%+g"%(element,count) for element,count in counts.items())
+
+
+if __name__ == "__main__":
+    import time
+
+    from helper_classes import load_quietly
+
+    parser = argparse.ArgumentParser(description="Check the mass and charge balance of the WormJam reactions")
+    parser.add_argument("folder",nargs="?",default="curation",help="SBtab folder to check")
+    parser.add_argument("--elements",nargs="+",default=None,help="elements to check (default: all)")
+    parser.add_argument("--show",type=int,default=20,help="imbalanced reactions listed")
+    parser.add_argument("--json",default=None,metavar="FILE",help="write the imbalanced reactions to FILE")
+    parser.add_argument("--baseline",default=None,metavar="FILE",help="only fail on reactions not imbalanced in FILE, written by --json")
+    args = parser.parse_args()
+
+    compiler = load_quietly(args.folder)
+    start = time.perf_counter()
+    balance = Balance(compiler)
+    mass = balance.mass_imbalanced(args.elements)
+    charge = balance.charge_imbalanced()
+    seconds = time.perf_counter()-start
+    for title,imbalanced,describe in (("Mass",mass,format_imbalance),("Charge",charge,lambda value:"%+g"%value)):
+        print("%s imbalanced reactions: %d"%(title,len(imbalanced)))
+        for key,val in list(imbalanced.items())[:args.show]:
+            print("    %s: %s"%(key,describe(val)))
+        if len(imbalanced) > args.show > 0:
+            print("    ... and",len(imbalanced)-args.show,"more")
+    print("%d of %d reactions checked for mass, %d for charge, %d formulas not parsed, in %.3fs"%(balance.mass_checked.sum(),len(balance.reactions),balance.charge_checked.sum(),len(balance.unparsed),seconds))
+    if args.json is not None:
+        with open(args.json,"w") as f:
+            json.dump({"mass":mass,"charge":charge},f,indent=4)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mass = [key for key in mass if key not in baseline["mass"]]
+        charge = [key for key in charge if key not in baseline["charge"]]
+        print("New imbalanced reactions:",", ".join(dict.fromkeys(mass+charge)) if mass or charge else "none")
+    if mass or charge:
+        exit(1)
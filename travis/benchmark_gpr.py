@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Benchmark of the GPR parser against the previous pyparsing path
+
+Usage: python travis/benchmark_gpr.py [curation folder]
+"""
+import sys
+import timeit
+from copy import deepcopy
+
+import pyparsing
+
+import gpr
+from helper_classes import ModelSystem
+
+FOLDER = sys.argv[1] if len(sys.argv) > 1 else "curation"
+REPEATS = 5
+
+compiler = ModelSystem()
+compiler.load_folder(FOLDER)
+rules = [val["!GeneAssociation"] for val in compiler.tables.get("Reaction").data.values()]
+
+
+def pyparsing_path():
+    #what tsv_to_sbml.py used to do for every reaction
+    for rule in rules:
+        parens = pyparsing.nestedExpr( '(', ')', content=pyparsing.Word(pyparsing.alphanums) | ' or ' | " and " )
+        r = parens.parseString("("+rule+")")[0].asList()
+        deepcopy(r)
+
+def gpr_cold():
+    gpr.parse_gpr.cache_clear()
+    for rule in rules:
+        gpr.parse_gpr(rule)
+
+def gpr_warm():
+    for rule in rules:
+        gpr.parse_gpr(rule)
+
+
+print(len(rules),"gene associations,",len(set(rules)),"unique")
+for name,func in [("pyparsing + deepcopy",pyparsing_path),("gpr (cold cache)",gpr_cold),("gpr (warm cache)",gpr_warm)]:
+    best = min(timeit.repeat(func,number=1,repeat=REPEATS))
+    print("%-22s %10.2f ms"%(name,best*1000))
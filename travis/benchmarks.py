@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""Benchmark suite of the build pipeline
+
+Times the stages of the pipeline on the curation tables and on synthetic copies scaled up 10 or 100 times,
+so regressions and poor scaling show up before the production models reach that size:
+    load SBtable / load ColumnarSBtable -- ModelSystem.load_folder with each table class
+    load active genes                  -- the Gene table as loaded by the build, only the genes in use
+    ModelIndex / validate_rxn_mets     -- cross-reference indexes, and the metabolite check on them
+    validation                         -- every rule of validation.Validator
+    balance                            -- mass and charge balance of every reaction, on a built stoichiometric matrix
+    GPR parsing                        -- every gene association, with a cold cache
+    knockouts                          -- reactions disabled by every single gene deletion, over bitsets
+    annotations                        -- gen_annotation_tree for every compound and reaction
+    serialization                      -- SBMLStreamWriter.fragment of those annotations
+    build: <stage>                     -- every stage of a cold build_model, as marked by its StageProfiler
+    build: incremental                 -- build_model again, reusing the fragments of the cold build
+
+Scaled folders repeat the Reaction, Compound, Gene and Pathway tables, renaming the IDs of every copy
+and the references to them. With --synthetic they are generated by synthetic_model.py instead, so the copies
+are interconnected like a single larger network. Both are kept in .build_cache/benchmarks between runs.
+
+Usage:
+    python travis/benchmarks.py
+    python travis/benchmarks.py --scales 1 10 100 --repeat 1 --json benchmarks.json
+    python travis/benchmarks.py --scales 10 --synthetic
+    python travis/benchmarks.py --json new.json --compare benchmarks.json
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+from lxml import etree
+
+import gpr
+from balance import Balance
+from build_cache import digest
+from helper_classes import ColumnarSBtable,ModelIndex,load_quietly
+from knockouts import circuit_of
+from profiler import max_rss_mb,StageProfiler
+from sbml_writer import SBMLStreamWriter
+import synthetic_model
+import tsv_to_sbml
+from validation import Validator
+
+SCALED_TABLES = ["Reaction","Compound","Gene","Pathway"]
+BENCHMARK_FOLDER = os.path.join(tsv_to_sbml.CACHE_FOLDER,"benchmarks")
+
+
+def _renamer(suffix,names):
+    """Helper function to get a function that adds the suffix to the words of a string that are in names"""
+    def rename(text):
+        return " ".join(word+suffix if word in names else word for word in text.split(" "))
+    return rename
+
+def scale_folder(source,dest,factor):
+    """Function to write a copy of an SBtab folder with the Reaction, Compound, Gene and Pathway tables repeated
+
+    Copy i > 0 of every entry has "_i" added to its ID, and the reaction formulas, gene associations and
+    pathways of copied reactions refer to the entities of the same copy. Other tables are copied as they are.
+
+        Arguments:
+            source {str} -- SBtab folder to scale up
+            dest {str} -- folder to write the scaled tables to
+            factor {int} -- number of copies
+    """
+    tables = load_quietly(source,columnar=False).tables
+    compounds = set(tables["Compound"].data)
+    os.makedirs(dest,exist_ok=True)
+    for name,table in tables.items():
+        with open(os.path.join(dest,name+"-SBtab.tsv"),"w",encoding="latin-1",newline="") as f:
+            writer = csv.writer(f,delimiter="\t")
+            writer.writerow([table.sbString])
+            writer.writerow(table.headers)
+            for copy in range(factor if name in SCALED_TABLES else 1):
+                suffix = "_%d"%copy if copy else ""
+                formula = _renamer(suffix,compounds)
+                for key,val in table.data.items():
+                    val = dict(val)
+                    if name == "Reaction" and copy:
+                        val["!ReactionFormula"] = formula(val["!ReactionFormula"])
+                        val["!GeneAssociation"] = gpr.TOKEN.sub(lambda m:m.group(0) if m.group(0) in "()" or m.group(0).lower() in gpr.OPERATORS else m.group(0)+suffix,val["!GeneAssociation"])
+                        val["!Pathway"] = val["!Pathway"]+suffix if val["!Pathway"] != "" else ""
+                    writer.writerow([key+(suffix if name in SCALED_TABLES else "")]+[val.get(header,"") for header in table.headers[1:]])
+
+def scaled_folder(source,factor,synthetic=False):
+    """Function to get a scaled-up copy of an SBtab folder, regenerated only when the source tables change
+
+        Keyword Arguments:
+            synthetic {bool} -- generate a synthetic model with synthetic_model.py rather than repeating the tables (default: {False})
+    """
+    if factor == 1 and not synthetic:
+        return source
+    dest = os.path.join(BENCHMARK_FOLDER,("synthetic_x%d" if synthetic else "x%d")%factor)
+    stamp = digest(factor,synthetic,*[open(os.path.join(source,f),"rb").read() for f in sorted(os.listdir(source)) if "SBtab.tsv" in f])
+    stamp_file = os.path.join(dest,"source.sha1")
+    if not os.path.isfile(stamp_file) or open(stamp_file).read() != stamp:
+        print("Generating the %dx tables in %s"%(factor,dest))
+        shutil.rmtree(dest,ignore_errors=True)
+        if synthetic:
+            synthetic_model.generate(dest,source,factor)
+        else:
+            scale_folder(source,dest,factor)
+        with open(stamp_file,"w") as f:
+            f.write(stamp)
+    return dest
+
+
+class Fixture():
+    """The loaded tables of a folder, and the annotation trees built from them, shared by the benchmarks
+
+        Arguments:
+            folder {str} -- SBtab folder to benchmark
+    """
+
+    def __init__(self,folder):
+        """Initialization function"""
+        self.folder = folder
+        self.compiler = load_quietly(folder)
+        self.compiler.index
+        self.db_dict = self.compiler.tables["Database"].data if "Database" in self.compiler.tables else {}
+        self.rules = list(self.compiler.tables["Reaction"].column("!GeneAssociation").values())
+        self.rows = [row for name in ("Compound","Reaction") for row in self.compiler.tables[name].data.values()]
+        self.annotations = self.annotate()
+
+    def annotate(self):
+        """Function to build the annotation of every compound and reaction"""
+        annotations = []
+        plans = {}
+        for row in self.rows:
+            parent = etree.Element(tsv_to_sbml.RDF_DESCRIPTION,nsmap=tsv_to_sbml.NS_MAP)
+            tsv_to_sbml.gen_annotation_tree(parent,self.db_dict,row,plans)
+            annotations.append(parent)
+        return annotations
+
+    def parse_rules(self):
+        """Function to parse every gene association with a cold cache"""
+        gpr.parse_gpr.cache_clear()
+        for rule in self.rules:
+            try:
+                gpr.parse_gpr(rule)
+            except ValueError:
+                pass
+
+    def serialize(self):
+        """Function to serialize every annotation"""
+        writer = SBMLStreamWriter(io.BytesIO(),tsv_to_sbml.NS_MAP)
+        for element in self.annotations:
+            writer.fragment(element)
+
+
+def _build(folder,workdir,cache_folder):
+    """Helper function to run build_model quietly, returning its profiler"""
+    profiler = StageProfiler()
+    with redirect_stdout(io.StringIO()):
+        result = tsv_to_sbml.build_model(folder,os.path.join(workdir,"model.xml"),cache_folder,profiler)
+    profiler.stop()
+    if result["status"] != "built":
+        raise RuntimeError("Build of %s failed: %s"%(folder,result["status"]))
+    return profiler
+
+def run_builds(folder,repeat):
+    """Function to time cold and incremental builds, returning a dictionary of stage:list of seconds"""
+    times = {}
+    for i in range(repeat):
+        workdir = tempfile.mkdtemp(prefix="wormjam_benchmark_")
+        try:
+            cache_folder = os.path.join(workdir,"cache")
+            for entry in _build(folder,workdir,cache_folder).stages:
+                times.setdefault("build: "+entry["stage"],[]).append(entry["seconds"])
+            os.remove(os.path.join(workdir,"model.xml.fingerprint")) #otherwise the model is up to date
+            times.setdefault("build: incremental",[]).append(_build(folder,workdir,cache_folder).report()["total_seconds"])
+        finally:
+            shutil.rmtree(workdir,ignore_errors=True)
+    return times
+
+def time_call(func,repeat):
+    """Function to time a function, returning the seconds of every repeat"""
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter()-start)
+    return times
+
+def run_benchmarks(folder,scale,repeat,builds=True):
+    """Function to run every benchmark on a folder
+
+        Returns:
+            list -- dictionaries of benchmark, scale, best_seconds and seconds (every repeat)
+    """
+    times = {}
+    times["load SBtable"] = time_call(lambda:load_quietly(folder,columnar=False),repeat)
+    times["load ColumnarSBtable"] = time_call(lambda:load_quietly(folder),repeat)
+    fixture = Fixture(folder)
+    gene_file = os.path.join(folder,"Gene-SBtab.tsv")
+    if os.path.isfile(gene_file):
+        active = fixture.compiler.index.active_genes()
+        times["load active genes"] = time_call(lambda:ColumnarSBtable(gene_file,where=active.__contains__),repeat)
+    times["ModelIndex"] = time_call(lambda:ModelIndex(fixture.compiler),repeat)
+    times["validate_rxn_mets"] = time_call(fixture.compiler.validate_rxn_mets,repeat)
+    times["validation"] = time_call(lambda:Validator(fixture.compiler).run(),repeat)
+    fixture.compiler.stoichiometry
+    times["balance"] = time_call(lambda:Balance(fixture.compiler).mass_imbalanced(),repeat)
+    times["GPR parsing"] = time_call(fixture.parse_rules,repeat)
+    circuit = circuit_of(fixture.compiler)
+    times["knockouts"] = time_call(lambda:circuit.disabled(np.eye(len(circuit.genes),dtype=bool)),repeat)
+    times["annotations"] = time_call(fixture.annotate,repeat)
+    times["serialization"] = time_call(fixture.serialize,repeat)
+    del fixture
+    if builds:
+        times.update(run_builds(folder,repeat))
+    return [{"benchmark":name,"scale":scale,"best_seconds":min(seconds),"seconds":seconds} for name,seconds in times.items()]
+
+def compare(results,baseline,threshold):
+    """Function to print the change of every benchmark against a baseline, returning the regressed benchmarks"""
+    previous = {(entry["benchmark"],entry["scale"]):entry["best_seconds"] for entry in baseline["results"]}
+    regressions = []
+    print("%-28s %6s %10s %10s %8s"%("Benchmark","Scale","Before(s)","After(s)","Ratio"))
+    for entry in results:
+        before = previous.get((entry["benchmark"],entry["scale"]))
+        if not before:
+            continue
+        ratio = entry["best_seconds"]/before
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print("%-28s %5dx %10.3f %10.3f %8.2f%s"%(entry["benchmark"],entry["scale"],before,entry["best_seconds"],ratio,flag))
+        if flag:
+            regressions.append(entry)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the WormJam build pipeline")
+    parser.add_argument("--folder",default="curation",help="SBtab folder to benchmark and scale up")
+    parser.add_argument("--scales",nargs="+",type=int,default=[1,10],help="scale factors to benchmark, 1 is the folder itself")
+    parser.add_argument("--synthetic",action="store_true",help="benchmark synthetic models from synthetic_model.py rather than repeated tables")
+    parser.add_argument("--repeat",type=int,default=3,help="times every benchmark is run, the best time is reported")
+    parser.add_argument("--no-builds",action="store_true",help="skip the full builds")
+    parser.add_argument("--json",default=None,metavar="FILE",help="write the results to FILE")
+    parser.add_argument("--compare",default=None,metavar="FILE",help="compare against the results of an earlier --json run")
+    parser.add_argument("--threshold",type=float,default=1.2,help="slowdown ratio reported as a regression by --compare")
+    args = parser.parse_args()
+
+    results = []
+    for scale in args.scales:
+        folder = scaled_folder(args.folder,scale,args.synthetic)
+        print("Benchmarking",folder)
+        for entry in run_benchmarks(folder,scale,args.repeat,builds=not args.no_builds):
+            print("    %-28s %5dx %10.3f s"%(entry["benchmark"],entry["scale"],entry["best_seconds"]))
+            results.append(entry)
+    report = {"python":platform.python_version(),"platform":platform.platform(),"max_rss_mb":max_rss_mb(),"results":results}
+    if args.json is not None:
+        with open(args.json,"w") as f:
+            json.dump(report,f,indent=4)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            if compare(results,json.load(f),args.threshold):
+                exit(1)
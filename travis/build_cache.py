@@ -0,0 +1,97 @@
+import hashlib
+import os
+import pickle
+
+CACHE_FILE = "fragments.pickle"
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+
+def digest(*parts):
+    """Function to hash any number of strings, bytes or plain python objects (dicts, lists...)"""
+    h = hashlib.sha1()
+    for part in parts:
+        if not isinstance(part,bytes):
+            part = repr(part).encode("utf-8","surrogatepass")
+        h.update(part)
+        h.update(b"\x00")
+    return h.hexdigest()
+
+def module_paths(*names):
+    """Function to get the paths of modules of the travis folder, e.g. the code a cache depends on"""
+    return [os.path.join(SCRIPTS_FOLDER,name+".py") for name in sorted(names)]
+
+
+class FragmentCache():
+    """Class for reusing the serialized SBML of unchanged entities between builds
+
+    Every entity (gene product, group, species...) is stored as the bytes written by
+    SBMLStreamWriter, together with a hash of the rows it was generated from.
+    The whole cache is discarded when the build code or the shared context
+    (e.g. the Database table) changes.
+
+        Arguments:
+            folder {str} -- folder to keep the cache in, None disables caching
+
+        Keyword Arguments:
+            sources {list} -- paths of the source files that generate the SBML (default: {None})
+            context {list} -- objects every fragment depends on (default: {None})
+    """
+
+    def __init__(self,folder,sources=None,context=None):
+        """Initialization function"""
+        self.folder = folder
+        self.salt = digest(*[open(path,"rb").read() for path in sorted(sources or [])],*(context or []))
+        self.previous = {}
+        self.current = {}
+        self.hits = 0
+        self.misses = 0
+        self._pending = None
+        if folder is not None and os.path.isfile(os.path.join(folder,CACHE_FILE)):
+            try:
+                with open(os.path.join(folder,CACHE_FILE),"rb") as f:
+                    cached = pickle.load(f)
+                if cached["salt"] == self.salt:
+                    self.previous = cached["sections"]
+            except Exception as e:
+                print("Build cache could not be read, rebuilding everything:",e)
+
+    def reuse(self,writer,section,key,*parts):
+        """Function to write the cached fragment of an entity if its source rows are unchanged
+
+            Arguments:
+                writer {SBMLStreamWriter} -- writer of the current build
+                section {str} -- name of the section, e.g. "Reaction"
+                key {str} -- ID of the entity
+                *parts -- everything the entity is generated from, e.g. its row and any referenced rows
+
+            Returns:
+                bool -- True if the fragment was written, otherwise write() must be called with the new element
+        """
+        row_digest = digest(*parts)
+        cached = self.previous.get(section,{}).get(key)
+        if cached is not None and cached[0] == row_digest:
+            self.current.setdefault(section,{})[key] = cached
+            writer.write_fragment(cached[1])
+            self.hits += 1
+            return True
+        self._pending = (section,key,row_digest)
+        self.misses += 1
+        return False
+
+    def write(self,writer,section,key,element):
+        """Function to write a newly generated entity and store its fragment"""
+        fragment = writer.fragment(element)
+        assert self._pending is not None and self._pending[:2] == (section,key),"write() must follow a failed reuse() of the same entity"
+        self.current.setdefault(section,{})[key] = (self._pending[2],fragment)
+        self._pending = None
+        writer.write_fragment(fragment)
+
+    def save(self):
+        """Function to store the fragments of this build, dropping entities that no longer exist"""
+        if self.folder is None:
+            return
+        os.makedirs(self.folder,exist_ok=True)
+        path = os.path.join(self.folder,CACHE_FILE)
+        with open(path+".tmp","wb") as f:
+            pickle.dump({"salt":self.salt,"sections":self.current},f,protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path+".tmp",path)
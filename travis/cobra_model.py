@@ -0,0 +1,66 @@
+import cobra
+
+import gpr
+
+MODEL_ID = "WormJamTestBuild"
+MODEL_NAME = "WormJam Draft Model"
+
+
+def clip(sid,prefix):
+    """Function to remove the SBML type prefix from an ID, as cobra does when reading SBML"""
+    return sid[len(prefix):] if sid.startswith(prefix) else sid
+
+def _charge(value):
+    """Helper function to convert a !Charge cell, blanks are written to the SBML as 0"""
+    try:
+        return int(float(value))
+    except ValueError:
+        return 0
+
+def build_cobra_model(compiler):
+    """Function to build a cobra.Model straight from the curation tables, without writing and reading SBML
+
+    The model has the same IDs, bounds, stoichiometry and gene rules as cobra.io.read_sbml_model gives
+    for the output of tsv_to_sbml.py, but none of the annotations.
+
+        Arguments:
+            compiler {ModelSystem} -- model with the Compartment, Compound and Reaction tables loaded
+
+        Returns:
+            cobra.Model -- model without an objective
+    """
+    model = cobra.Model(MODEL_ID,name=MODEL_NAME)
+    model.compartments = {key:val["!Name"] for key,val in compiler.tables.get("Compartment").data.items()}
+
+    metabolites = {}
+    for key,val in compiler.tables.get("Compound").data.items():
+        metabolites[key] = cobra.Metabolite(clip(key,"M_"),formula=val["!Formula"],name=val["!Name"],compartment=val["!Location"],charge=_charge(val["!Charge"]))
+    model.add_metabolites(list(metabolites.values()))
+
+    reactions = []
+    for key,val in compiler.tables.get("Reaction").data.items():
+        reversible = val["!IsReversible"].lower() == "true"
+        reaction = cobra.Reaction(clip(key,"R_"),name=val["!Name"],subsystem=val["!Pathway"],lower_bound=-1000 if reversible else 0,upper_bound=1000)
+        reactants,products = compiler.index.reaction_formulas[key]
+        stoichiometry = {}
+        for side,sign in ((reactants,-1),(products,1)):
+            if "" in side: #empty side of the reaction, e.g. exchanges
+                continue
+            for met,coefficient in side.items():
+                if met not in metabolites: #not in the Compound table, validate_rxn_mets reports these
+                    metabolites[met] = cobra.Metabolite(clip(met,"M_"))
+                stoichiometry[metabolites[met]] = stoichiometry.get(metabolites[met],0)+sign*float(coefficient)
+        reaction.add_metabolites(stoichiometry)
+        try:
+            node = gpr.parse_gpr(val["!GeneAssociation"])
+        except ValueError: #reported by the build, leave the reaction without genes
+            node = None
+        reaction.gene_reaction_rule = gpr.to_string(node)
+        reactions.append(reaction)
+    model.add_reactions(reactions)
+    model.genes.sort() #cobra collects the genes of the rules in set order, which changes between runs
+    if "Gene" in compiler.tables and "!Locus" in compiler.tables.get("Gene").headers:
+        names = compiler.tables.get("Gene").column("!Locus")
+        for gene in model.genes:
+            gene.name = names.get(gene.id,"")
+    return model
@@ -0,0 +1,78 @@
+import gzip
+import os
+
+FORMATS = ["sbml","sbml.gz","json","mat"] #plain and gzip compressed SBML, cobra JSON and cobra MATLAB
+COBRA_FORMATS = ["json","mat"]
+
+
+def export_paths(output,formats):
+    """Function to get the file of every format, as a dictionary of format:path, e.g. WormJam.xml.gz or WormJam.json
+
+        Arguments:
+            output {str} -- SBML file of the build, the other files are named after it
+            formats {list} -- formats to export, from FORMATS
+    """
+    root = os.path.splitext(output)[0]
+    paths = {"sbml":output,"sbml.gz":output+".gz","json":root+".json","mat":root+".mat"}
+    return {fmt:paths[fmt] for fmt in formats}
+
+
+class SBMLOutputs():
+    """Binary file object writing the SBML to the plain and compressed SBML files of a build at once
+
+        Arguments:
+            paths {dict} -- format:path, as from export_paths, formats other than SBML are ignored
+
+        Keyword Arguments:
+            deterministic {bool} -- leave the time out of the gzip header, so identical models give identical files (default: {True})
+    """
+
+    def __init__(self,paths,deterministic=True):
+        """Opens every SBML file"""
+        self.files = []
+        self._raw = [] #files under a compressor, closed after it
+        if "sbml" in paths:
+            self.files.append(open(paths["sbml"],"wb"))
+        if "sbml.gz" in paths:
+            raw = open(paths["sbml.gz"],"wb")
+            self._raw.append(raw)
+            name = os.path.basename(paths["sbml.gz"])[:-len(".gz")]
+            self.files.append(gzip.GzipFile(filename=name,mode="wb",compresslevel=6,fileobj=raw,mtime=0 if deterministic else None))
+
+    def write(self,data):
+        """Function to write the same bytes to every file"""
+        for f in self.files:
+            f.write(data)
+
+    def close(self):
+        """Function to finish every file"""
+        for f in self.files+self._raw:
+            f.close()
+
+
+def remove_exports(paths):
+    """Function to delete the files of earlier exports, so every file left belongs to the latest build"""
+    for path in paths.values():
+        if os.path.isfile(path):
+            os.remove(path)
+
+def write_cobra(compiler,paths):
+    """Function to write the cobra formats of a build, from the curation tables rather than the SBML
+
+    The model is built by cobra_model.build_cobra_model, so it has the IDs, names, bounds, stoichiometry,
+    formulas, charges, compartments, subsystems, genes and gene rules of the SBML, but not its annotations,
+    notes and groups.
+
+        Arguments:
+            compiler {ModelSystem} -- loaded tables of the build
+            paths {dict} -- format:path, as from export_paths, formats other than the cobra ones are ignored
+    """
+    if not any(fmt in paths for fmt in COBRA_FORMATS):
+        return
+    import cobra
+    from cobra_model import build_cobra_model #cobra is only needed when exporting to its formats
+    model = build_cobra_model(compiler)
+    if "json" in paths:
+        cobra.io.save_json_model(model,paths["json"])
+    if "mat" in paths:
+        cobra.io.save_matlab_model(model,paths["mat"])
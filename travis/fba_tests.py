@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Growth checks of basic_fba.py and restricted_fba.py on a single in-process model
+
+The cobra model is built straight from the curation tables, so the SBML file is not needed, and both
+scenarios run on the same model and solver, each within its own context so changes are undone afterwards.
+"""
+from cobra_model import build_cobra_model
+from helper_classes import ModelSystem
+
+BIOMASS = "BIO0100"
+
+
+def basic_growth(model):
+    """Function to optimise growth with oxygen and EXC0050 added to the medium"""
+    with model:
+        medium = model.medium
+        medium["O2_Exchange_reactions_e"] = 1000
+        medium["EXC0050"] = 1000
+        model.medium = medium
+        return model.optimize()
+
+def restricted_growth(model):
+    """Function to optimise growth with every exchange closed"""
+    with model:
+        medium = model.medium
+        for i in medium:
+            medium[i] = 0
+        model.medium = medium
+        return model.optimize()
+
+def report(name,solution):
+    """Function to print a solution"""
+    print("---------------------------------------------")
+    print(name,"solution:")
+    print(solution.objective_value)
+    print(solution.status)
+
+
+if __name__ == "__main__":
+    compiler = ModelSystem(columnar=True)
+    compiler.load_folder("curation",snapshot=".build_cache/tables.pickle")
+    model = build_cobra_model(compiler)
+    print("Model:")
+    print(len(model.reactions),"reactions")
+    print(len(model.metabolites),"metabolites")
+    print(len(model.genes),"genes")
+    model.objective = model.reactions.get_by_id(BIOMASS)
+
+    basic = basic_growth(model)
+    report("Basic",basic)
+    restricted = restricted_growth(model)
+    report("Restricted",restricted)
+
+    assert abs(basic.objective_value) > model.tolerance, "Flux not carried in normal growth"
+    assert abs(restricted.objective_value) <= model.tolerance, "Flux carried under restricted conditions"
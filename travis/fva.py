@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""Parallel flux variability analysis and blocked reaction detection
+
+The reactions are split into chunks over a pool of worker processes. Every worker builds the cobra model from
+the curation tables once, like scenarios.py, and keeps its solver for all of its chunks, so every LP starts from
+the basis of the previous one. Only the objective coefficients of one reaction are changed between solves.
+
+Two modes:
+    fva      -- minimum and maximum flux of every reaction, optionally loopless and within a fraction of the
+                optimum of the objective of a scenario
+    blocked  -- only whether every reaction can carry flux. Every solution also shows which other reactions of
+                the chunk carry flux, and these are not solved for again
+Reactions found blocked by topology.py from the network structure alone are not solved for at all.
+
+Results are cached in .build_cache/fva, keyed on the fingerprint of the curation tables, the modules the
+analysis imports and the settings, so an unchanged model is not analysed twice.
+
+Usage:
+    python travis/fva.py --blocked
+    python travis/fva.py --fraction 0.9 --scenarios travis/Scenario-SBtab.tsv --base basic_growth
+    python travis/fva.py --loopless --output fva_results.tsv --workers 4
+    python travis/fva.py --blocked --merge results.json
+"""
+import argparse
+import csv
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from build_cache import digest,module_paths
+from cobra_model import build_cobra_model,clip
+from helper_classes import load_quietly
+import scenarios
+import topology
+
+CACHE_FOLDER = os.path.join(".build_cache","fva")
+SOURCES = module_paths("fva","helper_classes","gpr","stoichiometry","cobra_model","scenarios","knockouts","topology") #results depend on the loading, model, scenario and topology code, part of the cache key
+
+_model = None #model of the current worker process
+_loopless = False
+
+
+def _init_worker(folder,snapshot,scenario,fraction,loopless):
+    """Function run once in every worker process to build its model and solver
+
+    The scenario is applied for good, as the model only lives as long as the worker. With a fraction, the
+    objective of the scenario is constrained to at least that fraction of its optimum.
+    """
+    global _model,_loopless
+    from optlang.symbolics import Zero
+    _model = build_cobra_model(load_quietly(folder,snapshot=snapshot))
+    _loopless = loopless
+    if scenario is not None:
+        scenarios.apply_scenario(_model,scenario)
+    if fraction is not None:
+        optimum = _model.slim_optimize(error_value=float("nan"))
+        if math.isnan(optimum):
+            raise ValueError("The objective cannot be optimised, status: "+_model.solver.status)
+        _model.solver.add(_model.problem.Constraint(_model.solver.objective.expression,lb=fraction*optimum,name="fva_objective"))
+    _model.objective = _model.problem.Objective(Zero,direction="max")
+
+def _solve(reaction,direction):
+    """Helper function to get the minimum or maximum flux of a reaction on the model of the worker"""
+    from cobra.flux_analysis.loopless import loopless_fva_iter
+    _model.solver.objective.direction = direction
+    _model.solver.objective.set_linear_coefficients({reaction.forward_variable:1,reaction.reverse_variable:-1})
+    _model.slim_optimize()
+    if _model.solver.status != "optimal":
+        value = float("nan")
+    elif _loopless:
+        value = loopless_fva_iter(_model,reaction)
+    else:
+        value = _model.solver.objective.value
+    _model.solver.objective.set_linear_coefficients({reaction.forward_variable:0,reaction.reverse_variable:0})
+    return value
+
+def _fva_chunk(ids):
+    """Function to find the minimum and maximum flux of every reaction of a chunk, as a dictionary of ID:(min,max)"""
+    reactions = [_model.reactions.get_by_id(key) for key in ids]
+    minimum = {reaction.id:_solve(reaction,"min") for reaction in reactions}
+    return {reaction.id:(minimum[reaction.id],_solve(reaction,"max")) for reaction in reactions}
+
+def _blocked_chunk(ids):
+    """Function to find the reactions of a chunk that cannot carry flux, as a list of IDs"""
+    reactions = [_model.reactions.get_by_id(key) for key in ids]
+    carries = set()
+    for reaction in reactions:
+        if reaction.id in carries:
+            continue
+        for direction in ("max","min") if reaction.lower_bound < 0 else ("max",):
+            value = _solve(reaction,direction)
+            if not math.isnan(value) and abs(value) > _model.tolerance:
+                fluxes = _model.solver.primal_values #every reaction carrying flux in this solution is not blocked either
+                carries.update(other.id for other in reactions if abs(fluxes[other.id]-fluxes[other.reverse_id]) > _model.tolerance)
+                break
+    return [reaction.id for reaction in reactions if reaction.id not in carries]
+
+def _chunks(items,count):
+    """Helper function to split a list into count chunks of consecutive items"""
+    size = max(1,math.ceil(len(items)/count))
+    return [items[i:i+size] for i in range(0,len(items),size)]
+
+def run_fva(compiler,folder="curation",snapshot=".build_cache/tables.pickle",scenario=None,fraction=None,loopless=False,blocked=False,workers=None,cache_folder=CACHE_FOLDER):
+    """Function to run flux variability analysis, or find the blocked reactions, in parallel
+
+        Arguments:
+            compiler {ModelSystem} -- loaded curation tables, for the fingerprint and the structural analysis
+
+        Keyword Arguments:
+            folder {str} -- curation folder the workers build the model from (default: {"curation"})
+            snapshot {str} -- table snapshot used by the workers to load the folder quickly (default: {".build_cache/tables.pickle"})
+            scenario {dict} -- scenario applied to the model, as from scenarios.load_scenarios (default: {None})
+            fraction {float} -- fraction of the optimum of the objective to keep, None for no constraint (default: {None})
+            loopless {bool} -- remove flux through loops from the minimum and maximum (default: {False})
+            blocked {bool} -- only find the blocked reactions (default: {False})
+            workers {int} -- number of worker processes, defaults to the number of CPUs (default: {None})
+            cache_folder {str} -- folder of the cached results, None disables caching (default: {CACHE_FOLDER})
+
+        Returns:
+            dict -- cobra reaction ID:(minimum,maximum), or the list of blocked cobra reaction IDs
+    """
+    key = digest(compiler.fingerprint(),*[open(path,"rb").read() for path in SOURCES],scenario,fraction,loopless,blocked)
+    cached = os.path.join(cache_folder,key+".json") if cache_folder is not None else None
+    if cached is not None and os.path.isfile(cached):
+        print("Model unchanged since the last run, reusing",cached)
+        with open(cached) as f:
+            result = json.load(f)
+        return result if blocked else {rxn:tuple(bounds) for rxn,bounds in result.items()}
+
+    structural = set(topology.Topology(compiler).blocked()[0])
+    ids = [clip(rxn,"R_") for rxn in compiler.tables.get("Reaction").data if rxn not in structural]
+    print("Solving for %d reactions, %d structurally blocked"%(len(ids),len(structural)))
+    workers = workers or os.cpu_count()
+    chunks = _chunks(ids,workers*4)
+    with ProcessPoolExecutor(max_workers=workers,initializer=_init_worker,initargs=(folder,snapshot,scenario,fraction,loopless)) as executor:
+        if blocked:
+            result = [clip(rxn,"R_") for rxn in compiler.tables.get("Reaction").data if rxn in structural]
+            for chunk in executor.map(_blocked_chunk,chunks):
+                result.extend(chunk)
+        else:
+            result = {clip(rxn,"R_"):(0.0,0.0) for rxn in compiler.tables.get("Reaction").data if rxn in structural}
+            for chunk in executor.map(_fva_chunk,chunks):
+                result.update(chunk)
+
+    if cached is not None:
+        os.makedirs(cache_folder,exist_ok=True)
+        with open(cached+".tmp","w") as f:
+            json.dump(result,f)
+        os.replace(cached+".tmp",cached)
+    return result
+
+def write_results(result,filename):
+    """Function to write the minimum and maximum fluxes as an SBtab table"""
+    with open(filename,"w",newline="") as f:
+        writer = csv.writer(f,delimiter="\t")
+        writer.writerow(["!!SBtab SBtabVersion='1.0' TableType='FluxVariability' TableName='Flux variability'"])
+        writer.writerow(["!ID","!Minimum","!Maximum"])
+        for rxn,(minimum,maximum) in result.items():
+            writer.writerow([rxn,minimum,maximum])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flux variability analysis of the WormJam model in parallel")
+    parser.add_argument("--blocked",action="store_true",help="only find the reactions that cannot carry flux")
+    parser.add_argument("--fraction",type=float,default=None,help="keep the objective at this fraction of its optimum, e.g. 0.9")
+    parser.add_argument("--loopless",action="store_true",help="remove flux through loops from the minimum and maximum")
+    parser.add_argument("--scenarios",default=None,help="scenario SBtab file, see scenarios.py")
+    parser.add_argument("--base",default=None,help="ID of the scenario applied to the model")
+    parser.add_argument("--folder",default="curation",help="curation folder")
+    parser.add_argument("--workers",type=int,default=None,help="number of worker processes")
+    parser.add_argument("--output",default="fva_results.tsv",help="results file of the flux variability analysis")
+    parser.add_argument("--merge",default=None,metavar="FILE",help="add the blocked reactions to the tests of a memote results.json")
+    args = parser.parse_args()
+
+    scenario = None
+    if args.scenarios is not None:
+        table = scenarios.load_scenarios(args.scenarios)
+        if args.base not in table:
+            print("--base must be one of:",", ".join(table))
+            exit(1)
+        scenario = table[args.base]
+    elif args.fraction is not None:
+        scenario = dict.fromkeys(scenarios.COLUMNS,"") #the default objective with the medium of the tables
+
+    snapshot = os.path.join(".build_cache","tables.pickle")
+    compiler = load_quietly(args.folder,snapshot=snapshot) #also writes the snapshot once, rather than in every worker
+    result = run_fva(compiler,args.folder,snapshot,scenario,args.fraction,args.loopless,args.blocked,args.workers)
+    if args.blocked:
+        total = len(compiler.tables.get("Reaction").data)
+        print("%d of %d reactions blocked"%(len(result),total))
+        if args.merge is not None:
+            topology.merge_results({"test_blocked_reactions":topology.memote_result("Blocked Reactions","Reactions that cannot carry any flux, found by flux variability analysis.",result,total)},args.merge)
+    else:
+        write_results(result,args.output)
+        print("Flux ranges of %d reactions written to %s"%(len(result),args.output))
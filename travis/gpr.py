@@ -0,0 +1,111 @@
+import re
+from functools import lru_cache
+
+# Gene-reaction rules are parsed into small, immutable trees:
+#   ("gene", "WBGene00000001")
+#   ("and", (node, node, ...))
+#   ("or", (node, node, ...))
+# "and" binds tighter than "or", and brackets can be nested to any depth.
+
+TOKEN = re.compile(r"\(|\)|[^\s()]+")
+OPERATORS = ("and","or")
+
+
+def tokenize(rule):
+    """Function to split a gene association string into brackets, operators and gene identifiers"""
+    return [token.lower() if token.lower() in OPERATORS else token for token in TOKEN.findall(rule)]
+
+
+class _Parser():
+    """Recursive descent parser over a list of GPR tokens"""
+
+    def __init__(self,rule):
+        """Initialization function"""
+        self.rule = rule
+        self.tokens = tokenize(rule)
+        self.pos = 0
+
+    def _peek(self):
+        """Helper function to look at the next token without consuming it"""
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        """Helper function to consume the next token"""
+        token = self._peek()
+        if token is None:
+            raise ValueError("Unexpected end of gene association: "+self.rule)
+        self.pos += 1
+        return token
+
+    def parse(self):
+        """Function to parse the whole rule"""
+        node = self._expression()
+        if self._peek() is not None:
+            raise ValueError("Unexpected '%s' in gene association: %s"%(self._peek(),self.rule))
+        return node
+
+    def _expression(self):
+        """expression := term ("or" term)*"""
+        terms = [self._term()]
+        while self._peek() == "or":
+            self._next()
+            terms.append(self._term())
+        return terms[0] if len(terms) == 1 else ("or",tuple(terms))
+
+    def _term(self):
+        """term := factor ("and" factor)*"""
+        factors = [self._factor()]
+        while self._peek() == "and":
+            self._next()
+            factors.append(self._factor())
+        return factors[0] if len(factors) == 1 else ("and",tuple(factors))
+
+    def _factor(self):
+        """factor := gene | "(" expression ")" """
+        token = self._next()
+        if token == "(":
+            node = self._expression()
+            if self._next() != ")":
+                raise ValueError("Unbalanced brackets in gene association: "+self.rule)
+            return node
+        if token == ")" or token in OPERATORS:
+            raise ValueError("Unexpected '%s' in gene association: %s"%(token,self.rule))
+        return ("gene",token)
+
+
+@lru_cache(maxsize=None)
+def parse_gpr(rule):
+    """Function to parse a gene association string into a GPR tree
+
+    Results are cached on the raw string, as many reactions share the same association.
+
+        Arguments:
+            rule {str} -- gene association, e.g. "(WBGene1 and WBGene2) or WBGene3"
+
+        Returns:
+            tuple -- GPR tree, or None for an empty association
+    """
+    if rule.strip() == "":
+        return None
+    return _Parser(rule).parse()
+
+
+def genes(node):
+    """Function to list the genes referenced in a GPR tree, in order of appearance"""
+    if node is None:
+        return []
+    if node[0] == "gene":
+        return [node[1]]
+    found = []
+    for child in node[1]:
+        found.extend(genes(child))
+    return found
+
+
+def to_string(node):
+    """Function to write a GPR tree back as a gene association string, bracketing nested groups"""
+    if node is None:
+        return ""
+    if node[0] == "gene":
+        return node[1]
+    return (" "+node[0]+" ").join(to_string(child) if child[0] == "gene" else "("+to_string(child)+")" for child in node[1])
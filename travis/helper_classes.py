@@ -1,22 +1,131 @@
 import os
 import csv
+import hashlib
+import io
+import pickle
+import time
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import accumulate,chain
+
+import gpr
+
+VERSIONS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..","model_versions") #frozen snapshots of the curation tables
 class ModelSystem():
     """Class for reading SBtab files
     """
-    def __init__(self):
+    def __init__(self,columnar=False):
         """Initialization function
+
+        Keyword Arguments:
+            columnar {bool} -- load tables with the memory efficient ColumnarSBtable instead of SBtable (default: {False})
         """
+        self.table_class = ColumnarSBtable if columnar else SBtable
         self.tables = {}
         self.size = {} #potentially worth removing this - It logs number of entries in every table, but no longer needed.
+        self.load_times = {} #seconds taken to load each table
+        self._index = None
+        self._stoichiometry = None
     
-    def _load_table(self,name,filename):
+    def load_table(self,name,filename,columns=None,where=None):
         """Function to import a SBtab file into the ModelSystem, using the SBtable class
+
+        Loading only the columns and entries needed makes large tables nearly free, e.g. the genes in use out of
+        the Gene table. See read_sbtab.
+
+            Arguments:
+                name {str} -- name of the table, e.g. "Gene"
+                filename {str} -- Path to SBTab file of interest.
+
+            Keyword Arguments:
+                columns {list} -- headers of the columns to load besides the ID (default: {None} for all)
+                where {callable} -- function of the ID of an entry, only the entries it is true for are loaded (default: {None} for all)
+        """
+        table,seconds = _timed_load(self.table_class,filename,columns,where)
+        self._add_table(name,table,seconds)
+        if name in ("Reaction","Compound"): #the cross-references are built from these tables
+            self._index = None
+            self._stoichiometry = None
+
+    def _add_table(self,name,table,seconds):
+        """Helper function to register a loaded table"""
+        self.tables[name] = table
+        self.size[name] = table.rows-2
+        self.load_times[name] = seconds
+
+    def _load_parallel(self,name,paths,workers=None):
+        """Function to load several SBtab files at once in a process pool, largest files first"""
+        filenames = {sbfile:name+"/"+sbfile+"-SBtab.tsv" for sbfile in paths}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {sbfile:executor.submit(_timed_load,self.table_class,filenames[sbfile]) for sbfile in sorted(paths,key=lambda sbfile:os.path.getsize(filenames[sbfile]),reverse=True)}
+            for sbfile in paths:
+                table,seconds = futures[sbfile].result()
+                self._add_table(sbfile,table,seconds)
+                print("Loaded file: %s (%.2fs)"%(sbfile,seconds))
+
+    def _snapshot_version(self):
+        """Helper function to identify the table class and code a snapshot was written with"""
+        with open(os.path.abspath(__file__),"rb") as f:
+            return self.table_class.__name__+":"+hashlib.sha1(f.read()).hexdigest()
+
+    def _read_snapshot(self,snapshot,name,paths,exclude=()):
+        """Function to get the tables of a snapshot whose SBtab file has not changed since it was written
+
+        A table is reused when the size and modification time of its file match, or failing that, the file hash.
+        Returns the reusable tables, and whether the snapshot should be rewritten. Excluded tables are returned
+        if they can be reused, but the snapshot is not rewritten just because they are not in it.
         """
-        self.tables[name] = SBtable(filename)
-        self.size[name] = self.tables[name].rows-2
+        if not os.path.isfile(snapshot):
+            return {},True
+        try:
+            with open(snapshot,"rb") as f:
+                cached = pickle.load(f)
+        except Exception as e:
+            print("Snapshot could not be read, loading all files:",e)
+            return {},True
+        if cached.get("version") != self._snapshot_version():
+            return {},True
+        tables = {}
+        stale = set(cached["tables"])-set(exclude) != set(paths)-set(exclude)
+        for sbfile in paths:
+            entry = cached["tables"].get(sbfile)
+            filename = name+"/"+sbfile+"-SBtab.tsv"
+            if entry is None:
+                continue
+            if entry["stat"] == _file_stat(filename):
+                tables[sbfile] = entry["table"]
+            elif entry["sha1"] == _file_digest(filename): #e.g. a fresh checkout, store the new modification time
+                tables[sbfile] = entry["table"]
+                stale = True
+        return tables,stale
 
-    def load_folder(self,name):
-        """Function to bulk import multiple SBtab files using a folder and _load_table
+    def _write_snapshot(self,snapshot,name,kept=None):
+        """Function to store the loaded tables in a binary snapshot, used by load_folder(snapshot=...)
+
+        Keyword Arguments:
+            kept {dict} -- name:table of tables not loaded by load_folder, stored as they were (default: {None})
+        """
+        entries = {}
+        for sbfile,table in {**(kept or {}),**self.tables}.items():
+            filename = name+"/"+sbfile+"-SBtab.tsv"
+            entries[sbfile] = {"stat":_file_stat(filename),"sha1":_file_digest(filename),"table":table}
+        if os.path.dirname(snapshot) != "":
+            os.makedirs(os.path.dirname(snapshot),exist_ok=True)
+        with open(snapshot+".tmp","wb") as f:
+            pickle.dump({"version":self._snapshot_version(),"tables":entries},f,protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(snapshot+".tmp",snapshot)
+
+    def load_folder(self,name,parallel=False,workers=None,snapshot=None,exclude=None):
+        """Function to bulk import multiple SBtab files using a folder and load_table
+
+        Keyword Arguments:
+            parallel {bool} -- load the files concurrently in worker processes (default: {False})
+            workers {int} -- number of worker processes, defaults to the number of CPUs (default: {None})
+            snapshot {str} -- path of a binary snapshot of the parsed tables, unchanged files are loaded from it
+                and it is updated when any file changed (default: {None})
+            exclude {list} -- tables not to load, e.g. to load only part of them with load_table afterwards (default: {None})
         """
         success = False
         if os.path.isdir(name) == False:
@@ -37,87 +146,408 @@ class ModelSystem():
             else:
                 print("SBtab files found! Loading now!")
                 self.count=1
-                for sbfile in paths:
-                    print(" ".join(["Loading file:",sbfile]))
-                    self._load_table(sbfile,name+"/"+sbfile+"-SBtab.tsv")
+                self._index = None #the tables are changing, so the cross-references have to be rebuilt
+                self._stoichiometry = None
+                exclude = set(exclude or [])
+                cached,stale = self._read_snapshot(snapshot,name,paths,exclude) if snapshot else ({},False)
+                for sbfile,table in cached.items():
+                    if sbfile not in exclude:
+                        print(" ".join(["Loading file from snapshot:",sbfile]))
+                        self._add_table(sbfile,table,0.0)
+                missing = [sbfile for sbfile in paths if sbfile not in cached and sbfile not in exclude]
+                if parallel and missing:
+                    self._load_parallel(name,missing,workers)
+                else:
+                    for sbfile in missing:
+                        print(" ".join(["Loading file:",sbfile]))
+                        self.load_table(sbfile,name+"/"+sbfile+"-SBtab.tsv")
+                self.tables = {sbfile:self.tables[sbfile] for sbfile in paths if sbfile not in exclude} #keep the folder order
+                if snapshot and (missing or stale):
+                    self._write_snapshot(snapshot,name,{sbfile:cached[sbfile] for sbfile in exclude if sbfile in cached}) #excluded tables stay in the snapshot for full loads
 
-                print(" ".join([str(len(paths)),"files loaded into the model"]))
+                print(" ".join([str(len(self.tables)),"files loaded into the model"]))
                 success = True
     
+    def fingerprint(self):
+        """Function to hash the contents of every loaded SBtab file, identical tables give identical fingerprints"""
+        h = hashlib.sha1()
+        for name in sorted(self.tables):
+            h.update((name+":"+_file_digest(self.tables[name].name)+"\n").encode())
+        return h.hexdigest()
+
+    @property
+    def index(self):
+        """Cross-reference indexes between the tables (see ModelIndex), built on first use"""
+        if self._index is None:
+            self._index = ModelIndex(self)
+        return self._index
+
     def validate_rxn_mets(self):
-        """Function to check that all metabolites included in reactions are in the compounds table"""
-        met_list = self.tables.get("Compound").data.keys()
-        rxn_met_list = {}
-        for key,val in self.tables.get("Reaction").data.items():
-            r,p = self._process_reaction_string(val["!ReactionFormula"])
-            sub_mets = []
-            sub_mets.extend(r.keys())
-            sub_mets.extend(p.keys())
-            rxn_met_list[key] = sub_mets
-        missing = {key:[met for met in val if met not in met_list] for key,val in rxn_met_list.items() if any(met not in met_list for met in val) and [met for met in val if met not in met_list] != ['']}
-        return missing
+        """Function to check that all metabolites included in reactions are in the compounds table
+
+        Returns a dictionary of reaction:missing metabolites. See validation.Validator for the other checks.
+        """
+        from validation import Validator
+        return {finding["id"]:finding["values"] for finding in Validator(self).run(["missing_metabolite"])}
 
     def _process_reaction_string(self,rxn):
-        """Helper function to parse reaction strings"""
-
-        r,p = rxn.split("<=>")
-        def quick(frag):
-            """splitting function"""
-            frag = frag.split("+")
-            frag = [i.rstrip().lstrip() for i in frag] #remove leading and trailing whitespace.
-            frag = [i.split(" ") for i in frag] # split into each compound
-            return frag
-        r = quick(r)
-        p = quick(p)
-        #packaging
-        reactants = {(i[1] if len(i) == 2 else i[0]):(i[0] if len(i)==2 else "1") for i in r}
-        products = {(i[1] if len(i) == 2 else i[0]):(i[0] if len(i)==2 else "1") for i in p}
-        for d in [reactants,products]:
-            for key,val in d.items():
-                try:
-                    d[key] = str(float(val))
-                except:
-                    pass
-        return (reactants,products)
+        """Helper function to parse reaction strings, see parse_reaction_formula"""
+        return parse_reaction_formula(rxn)
+
+    @property
+    def stoichiometry(self):
+        """Sparse stoichiometric matrix of the Reaction table (see stoichiometry.Stoichiometry), built on first use"""
+        if self._stoichiometry is None:
+            from stoichiometry import Stoichiometry #scipy is only needed by the tools using the matrix
+            self._stoichiometry = Stoichiometry(self)
+        return self._stoichiometry
             
 
+class ModelIndex():
+    """Inverted indexes between the tables of a ModelSystem, so relational questions do not need a full scan.
+
+    All lists are in table order and must not be modified.
+
+        Arguments:
+            model {ModelSystem} -- model with at least the Reaction and Compound tables loaded
+    """
+
+    def __init__(self,model):
+        """Builds every index in a single pass over the Reaction and Compound tables"""
+        self.pathway_reactions = {}
+        self.metabolite_reactions = {}
+        self.gene_reactions = {}
+        self.compartment_species = {}
+        self.reaction_formulas = {} #(reactants,products) dictionaries of metabolite:stoichiometry
+        self.reaction_metabolites = {} #reactants then products, as in the reaction formula
+        self.reaction_genes = {}
+        self.invalid_formulas = {} #reaction:formula, for formulas that cannot be parsed, indexed as having no metabolites
+        for key,val in model.tables.get("Reaction").data.items():
+            self.pathway_reactions.setdefault(val["!Pathway"],[]).append(key)
+            try:
+                r,p = parse_reaction_formula(val["!ReactionFormula"])
+            except ValueError:
+                self.invalid_formulas[key] = val["!ReactionFormula"]
+                r,p = {},{}
+            self.reaction_formulas[key] = (r,p)
+            mets = list(r)+list(p)
+            self.reaction_metabolites[key] = mets
+            for met in dict.fromkeys(mets):
+                self.metabolite_reactions.setdefault(met,[]).append(key)
+            rule = val["!GeneAssociation"]
+            try:
+                genes = gpr.genes(gpr.parse_gpr(rule))
+            except ValueError: #malformed associations are reported by the build, index whatever gene names they have
+                genes = [token for token in gpr.tokenize(rule) if token not in ("(",")")+gpr.OPERATORS]
+            genes = list(dict.fromkeys(genes))
+            self.reaction_genes[key] = genes
+            for gene in genes:
+                self.gene_reactions.setdefault(gene,[]).append(key)
+        for key,location in model.tables.get("Compound").column("!Location").items():
+            self.compartment_species.setdefault(location,[]).append(key)
+
+    def reactions_in_pathway(self,pathway):
+        """Function to list the reactions whose !Pathway is the given pathway"""
+        return self.pathway_reactions.get(pathway,[])
+
+    def reactions_of_metabolite(self,metabolite):
+        """Function to list the reactions a metabolite takes part in"""
+        return self.metabolite_reactions.get(metabolite,[])
+
+    def reactions_of_gene(self,gene):
+        """Function to list the reactions whose gene association mentions a gene"""
+        return self.gene_reactions.get(gene,[])
+
+    def species_in_compartment(self,compartment):
+        """Function to list the compounds located in a compartment"""
+        return self.compartment_species.get(compartment,[])
+
+    def metabolites_of_reaction(self,reaction):
+        """Function to list the metabolites of a reaction"""
+        return self.reaction_metabolites.get(reaction,[])
+
+    def genes_of_reaction(self,reaction):
+        """Function to list the genes in the gene association of a reaction"""
+        return self.reaction_genes.get(reaction,[])
+
+    def active_genes(self):
+        """Function to get the set of genes used in at least one gene association"""
+        return set(self.gene_reactions)
+
+
+def parse_reaction_formula(rxn):
+    """Function to parse a reaction formula such as "2 M_a_c + M_b_c <=> M_c_c"
+
+    Returns a (reactants,products) tuple of dictionaries of metabolite:stoichiometry. Stoichiometries are
+    strings of floats ("2.0"), or left as written if they are not numbers. An empty side gives {"":"1.0"}.
+    """
+    r,p = rxn.split("<=>")
+    def quick(frag):
+        """splitting function"""
+        frag = frag.split("+")
+        frag = [i.rstrip().lstrip() for i in frag] #remove leading and trailing whitespace.
+        frag = [i.split(" ") for i in frag] # split into each compound
+        return frag
+    r = quick(r)
+    p = quick(p)
+    #packaging
+    reactants = {(i[1] if len(i) == 2 else i[0]):(i[0] if len(i)==2 else "1") for i in r}
+    products = {(i[1] if len(i) == 2 else i[0]):(i[0] if len(i)==2 else "1") for i in p}
+    for d in [reactants,products]:
+        for key,val in d.items():
+            try:
+                d[key] = str(float(val))
+            except:
+                pass
+    return (reactants,products)
+
+def load_quietly(folder,columnar=True,**kwargs):
+    """Function to load an SBtab folder into a new ModelSystem, without printing the loading messages
+
+        Arguments:
+            folder {str} -- SBtab folder to load
+
+        Keyword Arguments:
+            columnar {bool} -- load the tables with ColumnarSBtable (default: {True})
+            **kwargs -- passed on to ModelSystem.load_folder, e.g. snapshot
+    """
+    compiler = ModelSystem(columnar=columnar)
+    with redirect_stdout(io.StringIO()):
+        compiler.load_folder(folder,**kwargs)
+    return compiler
+
+def resolve_folder(name):
+    """Function to find an SBtab folder, given either its path or the name of a snapshot in model_versions"""
+    if os.path.isdir(name):
+        return name
+    snapshot = os.path.join(VERSIONS_FOLDER,name,"SBtab","tsv")
+    if os.path.isdir(snapshot):
+        return snapshot
+    print("No SBtab folder or model version called",name)
+    exit(1)
+
+def version_folders():
+    """Function to list the SBtab folders of every snapshot in model_versions, oldest first"""
+    return sorted(os.path.join(VERSIONS_FOLDER,name,"SBtab","tsv") for name in os.listdir(VERSIONS_FOLDER) if os.path.isdir(os.path.join(VERSIONS_FOLDER,name,"SBtab","tsv")))
+
+def _file_stat(filename):
+    """Helper function to get the size and modification time of a file"""
+    stat = os.stat(filename)
+    return (stat.st_size,stat.st_mtime_ns)
+
+def _file_digest(filename):
+    """Helper function to hash the contents of a file"""
+    with open(filename,"rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _timed_load(table_class,filename,columns=None,where=None):
+    """Helper function to load and time a single table, at module level so worker processes can run it"""
+    start = time.perf_counter()
+    table = table_class(filename,columns=columns,where=where)
+    return table,time.perf_counter()-start
+
+def _read_rows(filename,columns=None,where=None):
+    """Helper generator for the rows of an SBtab file, read one at a time
+
+    Yields the SBtab DocString and the headers of the columns kept first, then the values of every entry kept
+    as a list in the order of those headers. Rows shorter than the headers are blank apart from their ID.
+    Blank entries are yielded as None when every entry is read, as they count towards the size of the table.
+    Lines of entries that are not kept are not split into values at all.
+    """
+    with open(filename,encoding="latin-1") as tsvfile:
+        lines = iter(tsvfile)
+        docstring = _split_line(next(lines,""),lines) #row 1 - SBtab DocString
+        if docstring == []:
+            raise ValueError("%s has no SBtab DocString in its first row"%filename)
+        sbString = docstring[0]
+        headers = _split_line(next(lines,""),lines) #row 2 - headers of the table
+        if headers == []:
+            raise ValueError("%s has no headers in its second row"%filename)
+        if columns is not None:
+            columns = set(columns)
+            keep = [0]+[i for i in range(1,len(headers)) if headers[i] in columns]
+        else:
+            keep = range(len(headers))
+        yield sbString,[headers[i] for i in keep]
+        blank = [''] * len(keep)
+        for line in lines:
+            if '"' not in line: #the ID can be checked before splitting the line
+                key = line.partition("\t")[0].rstrip("\r\n")
+                if key == '' and where is None:
+                    yield None
+                    continue
+                if key == '' or (where is not None and not where(key)):
+                    continue
+            entry = _split_line(line,lines)
+            if (entry == [] or entry[0] == '') and where is None:
+                yield None
+                continue
+            if entry == [] or entry[0] == '' or (where is not None and not where(entry[0])):
+                continue
+            if len(entry) < len(headers):
+                yield [entry[0]]+blank[1:]
+            elif columns is None:
+                yield entry
+            else:
+                yield [entry[i] for i in keep]
+
+def _split_line(line,lines):
+    """Helper function to split a line of a TSV file into its values, as csv.reader would
+
+    Lines with quotes are left to the csv module, which reads on from lines if a quoted value spans several.
+    """
+    if '"' in line:
+        return next(csv.reader(chain([line],lines),delimiter="\t"),[])
+    line = line.rstrip("\r\n")
+    return line.split("\t") if line != '' else []
+
+def read_sbtab(filename,columns=None,where=None):
+    """Function to stream the entries of an SBtab file, without loading the whole table
+
+    Only the entries passing where are turned into dictionaries, e.g. where=active_genes.__contains__ reads
+    just the genes in use out of the whole Gene table. A repeated ID is yielded every time it occurs.
+
+        Arguments:
+            filename {str} -- Path to SBTab file of interest.
+
+        Keyword Arguments:
+            columns {list} -- headers of the columns to read besides the ID, headers the table does not have are
+                ignored and the columns keep the order of the file (default: {None} for all)
+            where {callable} -- function of the ID of an entry, only the entries it is true for are read (default: {None} for all)
+
+        Yields:
+            tuple -- ID and dictionary of the entry, with column headers as keys
+    """
+    rows = _read_rows(filename,columns,where)
+    sbString,headers = next(rows)
+    headers = headers[1:]
+    for entry in rows:
+        if entry is not None:
+            yield entry[0],dict(zip(headers,entry[1:]))
+
+def read_headers(filename):
+    """Function to get the column headers of an SBtab file, without reading its entries"""
+    rows = _read_rows(filename)
+    headers = next(rows)[1]
+    rows.close()
+    return headers
+
+
 class SBtable:
     """Importable class for loading SBTab files\nConverts SBTab as nested dictionary.\n
 
     instance.data = Dictionary of entries in SBTab\n
-    Each entry is a dictionary of the data associated with that entry, with column headers as keys.
+    Each entry is a dictionary of the data associated with that entry, with column headers as keys.\n
+    instance.duplicates = IDs used by more than one entry, only the last of which is kept in instance.data
         
         Arguments:
             xlsx {str} -- Path to SBTab file of interest.
         
         Keyword Arguments:
             headerRow {int} -- Excel row of the header information, (default: {2})
-            mode {str} -- version of SBtable to load
+            columns {list} -- headers of the columns to load besides the ID, see read_sbtab (default: {None} for all)
+            where {callable} -- function of the ID of an entry, only the entries it is true for are loaded (default: {None} for all)
         """
 
-    def __init__(self,filename,headerRow=2):
+    def __init__(self,filename,headerRow=2,columns=None,where=None):
         """Loads the SBTab file"""
         self.name = filename
-        with open(filename,encoding="latin-1") as tsvfile:
-            tsv = csv.reader(tsvfile,delimiter="\t")
-            entries = []
-            for row in tsv:
-                if tsv.line_num == 1: #row 1 - SBtab DocString
-                    self.sbString = row[0]
-                elif tsv.line_num == 2: #row 2 - headers of the table
-                    self.headers = row
-                else:
-                    entries.append(row)
-            # define size of data
-            self.cols = len(self.headers)
-            self.rows = len(entries)+2
-            # create the nested dict object
-            try:
-                self.data = {entry[0]:{self.headers[i]:(entry[i] if len(entry) >= len(self.headers) else '') for i in range(1,len(self.headers))} for entry in entries}
-                while '' in self.data:
-                    self.data.pop('')
-            except:
-                print(self.name)
-                print("tsv import failed. Aborting...")
-                exit()
-            #remove blank entries
+        rows = _read_rows(filename,columns,where)
+        self.sbString,self.headers = next(rows)
+        entries = list(rows)
+        self.rows = len(entries)+2 #blank entries included
+        entries = [entry for entry in entries if entry is not None]
+        # IDs of more than one entry, only the last of which is kept
+        counts = {}
+        for entry in entries:
+            counts[entry[0]] = counts.get(entry[0],0)+1
+        self.duplicates = [key for key,count in counts.items() if count > 1]
+        # define size of data
+        self.cols = len(self.headers)
+        # create the nested dict object
+        self.data = {entry[0]:{self.headers[i]:entry[i] for i in range(1,self.cols)} for entry in entries}
+
+    def column(self,header):
+        """Function to get a single column as a dictionary of ID:value"""
+        return {key:val[header] for key,val in self.data.items()}
+
+
+class ColumnarSBtable(SBtable):
+    """Memory efficient alternative to SBtable, with the same attributes.\n
+    Every column is stored as one string plus an array of offsets, instead of one dict per row.
+    instance.data is a read-only mapping view that builds the dictionary of an entry only when it is accessed,
+    so changes made to those dictionaries are not kept.
+
+        Arguments:
+            filename {str} -- Path to SBTab file of interest.
+
+        Keyword Arguments:
+            headerRow {int} -- Excel row of the header information, (default: {2})
+            columns {list} -- headers of the columns to load besides the ID, see read_sbtab (default: {None} for all)
+            where {callable} -- function of the ID of an entry, only the entries it is true for are loaded (default: {None} for all)
+        """
+
+    def __init__(self,filename,headerRow=2,columns=None,where=None):
+        """Loads the SBTab file"""
+        self.name = filename
+        rows = _read_rows(filename,columns,where)
+        self.sbString,self.headers = next(rows)
+        self.cols = len(self.headers)
+        rows = list(rows)
+        self.rows = len(rows)+2 #blank entries included
+        rows = [entry for entry in rows if entry is not None]
+        self._index = {}
+        duplicates = {}
+        for i,entry in enumerate(rows):
+            # a repeated ID replaces the earlier entry, but keeps its position
+            if entry[0] in self._index:
+                duplicates[entry[0]] = None
+            self._index[entry[0]] = i
+        self.duplicates = list(duplicates)
+        # compact the columns, columns without any values are not stored at all
+        self._text = []
+        self._offsets = []
+        for column in (list(zip(*rows))[1:self.cols] if rows else [()]*(self.cols-1)):
+            if any(column):
+                self._text.append("".join(column))
+                self._offsets.append(array("I",[0])+array("I",accumulate(map(len,column))))
+            else:
+                self._text.append("")
+                self._offsets.append(None)
+        self.data = _RowView(self)
+
+    def _cell(self,j,i):
+        """Helper function to get the value of column j for the entry stored at position i"""
+        offsets = self._offsets[j]
+        return self._text[j][offsets[i]:offsets[i+1]] if offsets is not None else ''
+
+    def _row(self,i):
+        """Helper function to build the dictionary of the entry stored at position i"""
+        return {self.headers[j+1]:self._cell(j,i) for j in range(self.cols-1)}
+
+    def column(self,header):
+        """Function to get a single column as a dictionary of ID:value, without building the entries"""
+        j = self.headers.index(header)-1
+        return {key:self._cell(j,i) for key,i in self._index.items()}
+
+
+class _RowView(Mapping):
+    """Read-only mapping of ID:entry dictionary over a ColumnarSBtable"""
+
+    def __init__(self,table):
+        self._table = table
+
+    def __getitem__(self,key):
+        return self._table._row(self._table._index[key])
+
+    def __contains__(self,key):
+        return key in self._table._index
+
+    def __iter__(self):
+        return iter(self._table._index)
+
+    def __len__(self):
+        return len(self._table._index)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
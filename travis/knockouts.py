@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""Gene knockout evaluation over bitsets
+
+Compiles every gene association into one boolean circuit shared by all reactions, then evaluates it for a whole
+batch of knockout sets at once, instead of walking the GPR tree of every reaction for every knockout set:
+    - the trees are normalised, nested "and"/"or" of the same kind are flattened, repeated children dropped and
+      children sorted, so associations that only differ in order or brackets become the same gate
+    - identical subtrees of all reactions become a single gate, so shared complexes are evaluated once
+    - gates are grouped into levels by depth, and every level is a sparse matrix of the gates and genes below it
+    - a batch of knockout sets is a boolean matrix (sets x genes) of the genes that are still active; one sparse
+      product per level counts the active inputs of every gate for every set, an "and" gate needs all of them
+      and an "or" gate any of them
+Reactions without a gene association, or with one that cannot be parsed, are never disabled, as in the build.
+
+Usage:
+    python travis/knockouts.py
+    python travis/knockouts.py curation --double --batch 4096
+"""
+import argparse
+from itertools import combinations
+
+import numpy as np
+from scipy import sparse
+
+import gpr
+
+BATCH = 2048 #knockout sets evaluated at a time
+
+
+def normalise(node):
+    """Function to put a GPR tree in normal form, e.g. "(b or (a or b)) and c" becomes "c and (a or b)"
+
+        Arguments:
+            node {tuple} -- GPR tree from gpr.parse_gpr
+
+        Returns:
+            tuple -- equivalent tree with the nested operators of the same kind flattened, and the children of
+                every operator unique and sorted
+    """
+    if node is None or node[0] == "gene":
+        return node
+    children = set()
+    for child in node[1]:
+        child = normalise(child)
+        if child[0] == node[0]:
+            children.update(child[1])
+        else:
+            children.add(child)
+    if len(children) == 1:
+        return children.pop()
+    return (node[0],tuple(sorted(children)))
+
+
+class GPRCircuit():
+    """Gene associations of the Reaction table compiled into a boolean circuit, see the module docstring
+
+        Arguments:
+            rules {dict} -- reaction:gene association
+
+    instance.genes = numpy array of the genes, the columns of the knockout matrices\n
+    instance.reactions = numpy array of the reactions, the columns of the results\n
+    instance.gates = number of distinct gates, after normalising and sharing subtrees
+    """
+
+    def __init__(self,rules):
+        """Compiles every gene association"""
+        self.reactions = np.array(list(rules),dtype=object)
+        self.gene_index = {}
+        self._nodes = {} #normalised tree:node number, genes are numbered after all gates are known
+        self._levels = {} #level:gate trees, a gate is one level above its deepest child
+        roots = []
+        for rule in rules.values():
+            try:
+                node = normalise(gpr.parse_gpr(rule))
+            except ValueError: #reported by the build, which leaves the reaction without genes
+                node = None
+            roots.append(self._add(node) if node is not None else None)
+        self.genes = np.array(list(self.gene_index),dtype=object)
+
+        # number the nodes, genes first then every level in turn, and link every gate to its inputs
+        numbers = {("gene",gene):i for gene,i in self.gene_index.items()}
+        offset = len(self.genes)
+        self._plan = [] #(first node of the level,sparse matrix of gates x inputs,inputs needed by every gate)
+        for level in sorted(self._levels):
+            gates = self._levels[level]
+            rows = []
+            cols = []
+            required = np.empty((len(gates),1),dtype=np.float32)
+            for j,tree in enumerate(gates):
+                numbers[tree] = offset+j
+                for child in tree[1]:
+                    rows.append(j)
+                    cols.append(numbers[child])
+                required[j] = len(tree[1]) if tree[0] == "and" else 1
+            inputs = sparse.csr_matrix((np.ones(len(rows),dtype=np.float32),(rows,cols)),shape=(len(gates),offset))
+            self._plan.append((offset,inputs,required))
+            offset += len(gates)
+        self.size = offset
+        self.gates = offset-len(self.genes)
+        self._roots = np.array([numbers[root] if root is not None else -1 for root in roots])
+        del self._nodes,self._levels
+
+    def _add(self,tree):
+        """Helper function to add a normalised tree and its subtrees to the circuit, returning the tree"""
+        if tree in self._nodes:
+            return tree
+        if tree[0] == "gene":
+            self.gene_index.setdefault(tree[1],len(self.gene_index))
+            self._nodes[tree] = 0
+            return tree
+        level = 1+max(self._nodes[self._add(child)] for child in tree[1])
+        self._nodes[tree] = level
+        self._levels.setdefault(level,[]).append(tree)
+        return tree
+
+    def knockout_matrix(self,knockouts):
+        """Function to turn knockout sets into a boolean matrix (sets x genes) of the knocked out genes
+
+        Genes that are in no gene association cannot disable anything, and are ignored.
+
+            Arguments:
+                knockouts {list} -- lists of genes
+        """
+        matrix = np.zeros((len(knockouts),len(self.genes)),dtype=bool)
+        for i,genes in enumerate(knockouts):
+            for gene in genes:
+                if gene in self.gene_index:
+                    matrix[i,self.gene_index[gene]] = True
+        return matrix
+
+    def disabled(self,knockouts,batch=BATCH):
+        """Function to find the reactions disabled by every knockout set
+
+            Arguments:
+                knockouts {numpy.ndarray} -- boolean matrix (sets x genes) of knocked out genes, see knockout_matrix
+
+            Keyword Arguments:
+                batch {int} -- knockout sets evaluated at a time, bounds the memory used (default: {BATCH})
+
+            Returns:
+                numpy.ndarray -- boolean matrix (sets x reactions) of the disabled reactions
+        """
+        result = np.zeros((len(knockouts),len(self.reactions)),dtype=bool)
+        has_rule = self._roots >= 0
+        roots = self._roots[has_rule]
+        for start in range(0,len(knockouts),batch):
+            active = np.empty((self.size,min(batch,len(knockouts)-start)),dtype=np.float32) #nodes x sets, so every level is a block of rows
+            active[:len(self.genes)] = ~knockouts[start:start+batch].T
+            for offset,inputs,required in self._plan:
+                active[offset:offset+inputs.shape[0]] = inputs@active[:offset] >= required
+            result[start:start+batch,has_rule] = (active[roots] == 0).T
+        return result
+
+    def disabled_reactions(self,genes):
+        """Function to list the reactions disabled by knocking out a list of genes"""
+        return list(self.reactions[self.disabled(self.knockout_matrix([genes]))[0]])
+
+
+def circuit_of(compiler):
+    """Function to compile the gene associations of the Reaction table of a ModelSystem"""
+    return GPRCircuit(compiler.tables.get("Reaction").column("!GeneAssociation"))
+
+
+if __name__ == "__main__":
+    import time
+
+    from helper_classes import load_quietly
+
+    parser = argparse.ArgumentParser(description="Evaluate single or double gene knockouts of the WormJam model over bitsets")
+    parser.add_argument("folder",nargs="?",default="curation",help="SBtab folder")
+    parser.add_argument("--double",action="store_true",help="also evaluate every pair of genes")
+    parser.add_argument("--batch",type=int,default=BATCH,help="knockout sets evaluated at a time")
+    args = parser.parse_args()
+
+    compiler = load_quietly(args.folder)
+    start = time.perf_counter()
+    circuit = circuit_of(compiler)
+    print("Compiled %d reactions, %d genes and %d gates in %.3fs"%(len(circuit.reactions),len(circuit.genes),circuit.gates,time.perf_counter()-start))
+
+    start = time.perf_counter()
+    single = circuit.disabled(np.eye(len(circuit.genes),dtype=bool),args.batch)
+    effective = single.any(axis=1)
+    print("Single deletions: %d of %d genes disable a reaction, %d distinct reaction sets (%.3fs)"%(effective.sum(),len(circuit.genes),len(np.unique(single[effective],axis=0)),time.perf_counter()-start))
+    if args.double:
+        start = time.perf_counter()
+        pairs = list(combinations(range(len(circuit.genes)),2))
+        synthetic = 0
+        for i in range(0,len(pairs),args.batch*8):
+            chunk = np.array(pairs[i:i+args.batch*8])
+            knockouts = np.zeros((len(chunk),len(circuit.genes)),dtype=bool)
+            knockouts[np.arange(len(chunk)),chunk[:,0]] = True
+            knockouts[np.arange(len(chunk)),chunk[:,1]] = True
+            disabled = circuit.disabled(knockouts,args.batch)
+            synthetic += (disabled & ~single[chunk[:,0]] & ~single[chunk[:,1]]).any(axis=1).sum() #only disabled by the pair
+        print("Double deletions: %d pairs, %d disable a reaction neither gene does alone (%.3fs)"%(len(pairs),synthetic,time.perf_counter()-start))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""Diff of two versions of the curation tables
+
+Compares two SBtab folders, e.g. two snapshots under model_versions/ or a snapshot and the live curation
+folder, and reports the entries added, removed and changed in every table. Rows are compared as hashes
+over the union of both headers, so only the rows that actually differ are looked at cell by cell.
+
+Usage:
+    python travis/model_diff.py 2019-08-01 curation
+    python travis/model_diff.py 2019-01-01 2019-08-01 --tables Reaction Compound Gene --output diff.tsv
+    python travis/model_diff.py model_versions/2019-08-01/SBtab/tsv curation --output diff.json
+    python travis/model_diff.py 2019-08-01 curation --rename '!Identifiers:WormBase=!Identifiers:wb'
+"""
+import argparse
+import csv
+import json
+
+from helper_classes import load_quietly,resolve_folder
+
+TSV_HEADERS = ["!Table","!ID","!Change","!Columns","!AnnotationChanged"]
+
+
+def load_version(name):
+    """Function to load every table of a version, without printing the loading messages"""
+    return load_quietly(resolve_folder(name))
+
+def row_hashes(table,headers,aliases={}):
+    """Function to hash every entry of a table over the given headers, headers missing from the table count as blank
+
+        Keyword Arguments:
+            aliases {dict} -- header:name of that column in this table, for renamed columns (default: {{}})
+
+        Returns:
+            dict -- ID:hash, in table order
+    """
+    keys = list(table.data)
+    columns = []
+    for header in headers:
+        header = aliases.get(header,header)
+        columns.append(list(table.column(header).values()) if header in table.headers[1:] else [""]*len(keys))
+    return dict(zip(keys,map(hash,zip(*columns)))) if columns else dict.fromkeys(keys,0)
+
+def _headers(old,new,renames):
+    """Helper function to get the union of the headers of two versions of a table, without their ID columns"""
+    headers = []
+    if old is not None:
+        headers.extend(renames.get(header,header) for header in old.headers[1:])
+    if new is not None:
+        headers.extend(header for header in new.headers[1:] if header not in headers)
+    return list(dict.fromkeys(headers))
+
+def diff_table(name,old,new,renames={}):
+    """Function to compare two versions of a table, either of which may be None if the table does not exist there
+
+    Yields a dictionary per added, removed or changed entry. Changed entries list the old and new value of
+    every changed column, under the new column name, and whether any of those is an !Identifiers annotation column.
+
+        Keyword Arguments:
+            renames {dict} -- old header:new header, for columns renamed between the versions (default: {{}})
+    """
+    headers = _headers(old,new,renames)
+    aliases = {new_header:old_header for old_header,new_header in renames.items()}
+    old_hashes = row_hashes(old,headers,aliases) if old is not None else {}
+    new_hashes = row_hashes(new,headers) if new is not None else {}
+    for key in old_hashes:
+        if key not in new_hashes:
+            yield {"table":name,"id":key,"change":"removed"}
+    for key,h in new_hashes.items():
+        if key not in old_hashes:
+            yield {"table":name,"id":key,"change":"added"}
+        elif old_hashes[key] != h:
+            old_row,new_row = old.data[key],new.data[key]
+            columns = {header:[old_row.get(aliases.get(header,header),""),new_row.get(header,"")] for header in headers if old_row.get(aliases.get(header,header),"") != new_row.get(header,"")}
+            yield {"table":name,"id":key,"change":"changed","columns":columns,"annotation":any(header.startswith("!Identifiers") for header in columns)}
+
+def diff_models(old,new,tables=None,renames={}):
+    """Function to compare two loaded versions of the model
+
+        Arguments:
+            old {ModelSystem} -- earlier version
+            new {ModelSystem} -- later version
+
+        Keyword Arguments:
+            tables {list} -- names of the tables to compare, defaults to every table in either version (default: {None})
+            renames {dict} -- old header:new header, for columns renamed between the versions (default: {{}})
+
+        Returns:
+            generator -- change dictionaries as from diff_table, table by table
+    """
+    if tables is None:
+        tables = list(old.tables)+[name for name in new.tables if name not in old.tables]
+    for name in tables:
+        yield from diff_table(name,old.tables.get(name),new.tables.get(name),renames)
+
+def write_tsv(changes,f):
+    """Function to write changes to an open file as an SBtab table, one row per change"""
+    writer = csv.writer(f,delimiter="\t")
+    writer.writerow(["!!SBtab SBtabVersion='1.0' TableType='ModelDiff' TableName='Model version differences'"])
+    writer.writerow(TSV_HEADERS)
+    for change in changes:
+        annotation = change.get("annotation")
+        writer.writerow([change["table"],change["id"],change["change"],"|".join(change.get("columns",[])),"" if annotation is None else str(annotation).upper()])
+        yield change
+
+def write_json(changes,f):
+    """Function to write changes to an open file as a JSON list, one change at a time"""
+    f.write("[")
+    for i,change in enumerate(changes):
+        f.write(("," if i else "")+"\n"+json.dumps(change))
+        yield change
+    f.write("\n]\n")
+
+def summarise(changes):
+    """Function to count the changes of every kind in every table"""
+    summary = {}
+    for change in changes:
+        counts = summary.setdefault(change["table"],{"added":0,"removed":0,"changed":0,"annotation":0})
+        counts[change["change"]] += 1
+        if change.get("annotation"):
+            counts["annotation"] += 1
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two versions of the WormJam SBtab tables")
+    parser.add_argument("old",help="earlier version, a folder or a model_versions snapshot such as 2019-08-01")
+    parser.add_argument("new",help="later version, a folder or a model_versions snapshot")
+    parser.add_argument("--tables",nargs="+",default=None,help="tables to compare, e.g. Reaction Compound Gene (default: all)")
+    parser.add_argument("--rename",nargs="+",default=[],metavar="OLD=NEW",help="columns renamed between the versions, compared as one column")
+    parser.add_argument("--output",default=None,help="file to write every change to, .json for JSON, otherwise TSV")
+    args = parser.parse_args()
+
+    old = load_version(args.old)
+    new = load_version(args.new)
+    try:
+        renames = dict(rename.split("=",1) for rename in args.rename)
+    except ValueError:
+        print("--rename takes OLD=NEW header pairs")
+        exit(1)
+    changes = diff_models(old,new,args.tables,renames)
+    if args.output is None:
+        summary = summarise(changes)
+    else:
+        with open(args.output,"w",newline="") as f:
+            summary = summarise((write_json if args.output.endswith(".json") else write_tsv)(changes,f))
+    for name,counts in summary.items():
+        print("%s: %d added, %d removed, %d changed (%d with annotation changes)"%(name,counts["added"],counts["removed"],counts["changed"],counts["annotation"]))
+    if not summary:
+        print("No differences")
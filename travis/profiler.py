@@ -0,0 +1,67 @@
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError: #not available on Windows
+    resource = None
+
+
+def max_rss_mb():
+    """Function to get the peak resident memory of this process so far, in MB, or None where it cannot be measured"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/2**20 if sys.platform == "darwin" else rss/2**10 #bytes on macOS, kilobytes elsewhere
+
+
+class StageProfiler():
+    """Class for timing the consecutive stages of a pipeline, such as the sections of the SBML build
+
+    Calling stage(name) ends the current stage and starts the next one, so stages can be marked in
+    straight-line code without restructuring it. Call stop() to end the last stage.
+
+    Every stage records its wall and CPU time, and the peak resident memory of the process at its end.
+    The peak only grows, so the stages that raise it are the ones that need the memory. Allocation
+    tracing (tracemalloc) is not used, as it slows lxml down several times over and skews the timings.
+    """
+
+    def __init__(self):
+        """Initialization function"""
+        self.stages = []
+        self._current = None
+        self._started = None
+        self._started_cpu = None
+
+    def stage(self,name):
+        """Function to end the current stage, if any, and start timing the next one"""
+        self._finish()
+        self._current = name
+        self._started = time.perf_counter()
+        self._started_cpu = time.process_time()
+
+    def _finish(self):
+        """Helper function to record the current stage"""
+        if self._current is None:
+            return
+        self.stages.append({
+            "stage":self._current,
+            "seconds":time.perf_counter()-self._started,
+            "cpu_seconds":time.process_time()-self._started_cpu,
+            "max_rss_mb":max_rss_mb()
+        })
+        self._current = None
+
+    def stop(self):
+        """Function to end the last stage"""
+        self._finish()
+
+    def report(self):
+        """Function to get the recorded stages, their total time and the peak memory as a dictionary"""
+        return {"stages":self.stages,"total_seconds":sum(entry["seconds"] for entry in self.stages),"max_rss_mb":max_rss_mb()}
+
+    def write(self,filename):
+        """Function to write the report as JSON"""
+        with open(filename,"w") as f:
+            json.dump(self.report(),f,indent=4)
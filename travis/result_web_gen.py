@@ -1,46 +1,22 @@
+"""Renders the memote results.json as the Report.html curation report
+
+The report is written to disk as it is rendered, test by test, rather than built up as one string. Values are
+rendered as nested tables and lists, like json2html did. Lists longer than LAZY_ITEMS (e.g. the IDs failing a
+test) are embedded as JSON instead, and only rendered in the browser, a page at a time, when their test is
+opened, which keeps the report small and quick to open.
+"""
+import html
 import json
-from bs4 import BeautifulSoup
-
-from json2html import *
-
-
-
-data = json.load(open("results.json","r"))
-meta = data["meta"]
-tests = data["tests"]
-meta_html = json2html.convert(json=meta)
-test_keys = list(tests.keys())
-settings = json.load(open("travis/settings.json","r"))["pipeline"]
-
-###Templates 
-collapsible_template = """<div class="card">
-    <div class="card-header" id="{0}">
-      <h2 class="mb-0">
-        <button class="btn btn-link btn-block text-left collapsed" type="button" data-toggle="collapse" data-target="#collapse{0}" aria-expanded="false" aria-controls="collapse{0}">
-          {1}
-        </button>
-      </h2>
-    </div>
-    <div id="collapse{0}" class="collapse" aria-labelledby="{0}" data-parent="#results">
-      <div class="card-body">
-			{2}
-      </div>
-    </div>
-  </div>"""
-toc_template = """<li><a href="#{0}">{1}</a></li>"""
-
-###building inserts
-collapsible_insert = ""
-toc_insert = ""
-for test in test_keys:
-	toc_insert += toc_template.format(test,test.replace("test","").replace("_"," ").title().replace("Ids","IDs").replace("Id ","ID "))+"\n"
-	collapsible_insert += collapsible_template.format(test,test.replace("test","").replace("_"," ").title().replace("Ids","IDs").replace("Id ","ID "),json2html.convert(json=tests[test]))+"\n"
-
-
 
+LAZY_ITEMS = 50 #longer lists are rendered in the browser
+TABLE = '<table class="table table-sm table-bordered table-responsive">'
+RESULT_ICONS = {
+    "passed":'passed <i class="fas fa-check-circle"></i>',
+    "failed":'failed <i class="fas fa-times-circle"></i>',
+}
 
 #double curly brackets for escaping string formatting
-blob = f"""<html>
+HEAD = """<html>
 <meta name="viewport" content="width=device-width, initial-scale=1.0">
 <head>
 <title>Curation Report</title>
@@ -91,14 +67,15 @@ th, td {{
 
 </head>
 <body>
-<h1>Report for the {settings["name"]} model for <i>{settings["organism"]}</i></h1>
-<small class="text-muted">Generated {meta["timestamp"]} UTC+00</small>
+<h1>Report for the {name} model for <i>{organism}</i></h1>
+<small class="text-muted">Generated {timestamp} UTC+00</small>
 <div id="toc_container">
 <p class="toc_title">Contents</p>
 <ul class="toc_list">
   <li><a href="#Metadata">Metadata</a></li>
-{toc_insert}
-</ul>
+"""
+
+METADATA = """</ul>
 </div>
 
 <div class="accordion" id="results">
@@ -113,13 +90,28 @@ th, td {{
 
     <div id="collapseOne" class="collapse show" aria-labelledby="Metadata" data-parent="#results">
       <div class="card-body">
-		{meta_html}
-      </div>
+"""
+
+COLLAPSIBLE_START = """  <div class="card">
+    <div class="card-header" id="{0}">
+      <h2 class="mb-0">
+        <button class="btn btn-link btn-block text-left collapsed" type="button" data-toggle="collapse" data-target="#collapse{0}" aria-expanded="false" aria-controls="collapse{0}">
+          {1}
+        </button>
+      </h2>
+    </div>
+    <div id="collapse{0}" class="collapse" aria-labelledby="{0}" data-parent="#results">
+      <div class="card-body">
+"""
+COLLAPSIBLE_END = """      </div>
     </div>
   </div>
-  {collapsible_insert}
-  
-</div>
+"""
+TOC = """  <li><a href="#{0}">{1}</a></li>
+"""
+
+# Renders the lazy lists of a test when it is first opened, LAZY_ITEMS items at a time
+TAIL = """</div>
 <a id="back-to-top" href="#" class="btn btn-dark btn-lg back-to-top" role="button"><i class="fas fa-chevron-up"></i></a>
 
 
@@ -129,7 +121,40 @@ th, td {{
 <script src="https://cdn.jsdelivr.net/npm/popper.js@1.16.1/dist/umd/popper.min.js" integrity="sha384-9/reFTGAW83EW2RDu2S0VKaIzap3H66lZH81PoYlFhbGU+6BZp6G7niu735Sk7lN" crossorigin="anonymous"></script>
 <script src="https://stackpath.bootstrapcdn.com/bootstrap/4.5.1/js/bootstrap.min.js" integrity="sha384-XEerZL0cuoUbHE4nZReLT7nx9gQrQreJekYhJD9WNWhH8nEW+0c5qq7aIo2Wl30J" crossorigin="anonymous"></script>
 <script>
+var PAGE = {page};
+function renderValue(value) {{
+        if (Array.isArray(value)) {{
+                var list = $('<ul></ul>');
+                value.forEach(function (item) {{ list.append($('<li></li>').append(renderValue(item))); }});
+                return list;
+        }}
+        if (value !== null && typeof value === 'object') {{
+                var table = $('{table}');
+                Object.keys(value).forEach(function (key) {{
+                        table.append($('<tr></tr>').append($('<th></th>').text(key)).append($('<td></td>').append(renderValue(value[key]))));
+                }});
+                return table;
+        }}
+        return document.createTextNode(value === null ? '' : String(value));
+}}
+function renderPage(block) {{
+        var items = block.data('items'), shown = block.data('shown');
+        var list = block.children('ul');
+        items.slice(shown, shown+PAGE).forEach(function (item) {{ list.append($('<li></li>').append(renderValue(item))); }});
+        block.data('shown', shown+PAGE);
+        block.children('button').toggle(shown+PAGE < items.length)
+                .text('Show more (' + Math.max(items.length-shown-PAGE, 0) + ' left)');
+}}
 $(document).ready(function(){{
+        $('.collapse').on('show.bs.collapse', function () {{
+                $(this).find('.lazy-json').not('.rendered').each(function () {{
+                        var block = $(this).addClass('rendered');
+                        block.data('items', JSON.parse(block.children('script').text())).data('shown', 0);
+                        block.append('<ul></ul>').append($('<button type="button" class="btn btn-sm btn-outline-secondary"></button>')
+                                .click(function () {{ renderPage(block); }}));
+                        renderPage(block);
+                }});
+        }});
         $(window).scroll(function () {{
                         if ($(this).scrollTop() > 50) {{
                                 $('#back-to-top').fadeIn();
@@ -149,11 +174,79 @@ $(document).ready(function(){{
 </body>
 </html>"""
 
-blob = blob.replace("""<table border="1">""","""<table class="table table-sm table-bordered table-responsive">""")
-blob = blob.replace("""failed""","""failed <i class="fas fa-times-circle"></i>""")
-blob = blob.replace("""passed""","""passed <i class="fas fa-check-circle"></i>""")
-
-soup = BeautifulSoup(blob,features="lxml")
 
-with open("Report.html","w+",encoding="utf-8") as f:
-	f.write(soup.prettify(formatter="html5"))
+def title(test):
+    """Function to turn a test name into a title, e.g. test_gene_product_annotation_wrong_ids -> Gene Product Annotation Wrong IDs"""
+    return test.replace("test","").replace("_"," ").title().replace("Ids","IDs").replace("Id ","ID ").strip()
+
+def _json(value):
+    """Helper function to embed JSON in a script element, which must not contain "</" """
+    return json.dumps(value,separators=(",",":")).replace("</","<\\/")
+
+def write_value(f,value,key=None):
+    """Function to write a value of the results as HTML
+
+    Dictionaries become tables of key and value, lists become lists, and lists longer than LAZY_ITEMS are
+    embedded as JSON for the browser to render. The results of tests get a pass or fail icon.
+
+        Arguments:
+            f {file} -- file to write to
+            value -- value to write
+
+        Keyword Arguments:
+            key {str} -- key of the value in its dictionary (default: {None})
+    """
+    if isinstance(value,dict):
+        f.write(TABLE)
+        for child_key,child in value.items():
+            f.write("<tr><th>"+html.escape(str(child_key))+"</th><td>")
+            write_value(f,child,"result" if key == "result" else child_key) #parametrized tests have a result per parameter
+            f.write("</td></tr>")
+        f.write("</table>")
+    elif isinstance(value,list):
+        if len(value) > LAZY_ITEMS:
+            f.write('<div class="lazy-json">%d items<script type="application/json">'%len(value))
+            f.write(_json(value))
+            f.write("</script></div>")
+        elif value:
+            f.write("<ul>")
+            for item in value:
+                f.write("<li>")
+                write_value(f,item)
+                f.write("</li>")
+            f.write("</ul>")
+    elif value is not None:
+        text = html.escape(str(value))
+        f.write(RESULT_ICONS.get(text,text) if key == "result" else text)
+
+def write_report(results,settings,filename="Report.html"):
+    """Function to write the report of memote results
+
+        Arguments:
+            results {dict} -- memote results, as in results.json
+            settings {dict} -- pipeline settings, for the model name and organism
+
+        Keyword Arguments:
+            filename {str} -- file to write the report to (default: {"Report.html"})
+    """
+    meta = results["meta"]
+    tests = results["tests"]
+    with open(filename,"w",encoding="utf-8") as f:
+        f.write(HEAD.format(name=html.escape(settings["name"]),organism=html.escape(settings["organism"]),timestamp=html.escape(str(meta.get("timestamp","")))))
+        for test in tests:
+            f.write(TOC.format(html.escape(test),title(test)))
+        f.write(METADATA)
+        write_value(f,meta)
+        f.write(COLLAPSIBLE_END)
+        for test,entry in tests.items():
+            f.write(COLLAPSIBLE_START.format(html.escape(test),title(test)))
+            write_value(f,entry)
+            f.write(COLLAPSIBLE_END)
+        f.write(TAIL.format(page=LAZY_ITEMS,table=TABLE))
+
+
+if __name__ == "__main__":
+    with open("results.json","r") as f:
+        results = json.load(f)
+    settings = json.load(open("travis/settings.json","r"))["pipeline"]
+    write_report(results,settings)
@@ -1,7 +1,161 @@
+"""Runs the memote test suite on WormJam.xml and writes results.json
+
+Results are reused at two levels:
+    - the whole results.json, when the build fingerprint has not changed since an earlier run
+    - every single test, when the parts of the model it reads have not changed since it was last run, so only
+      the tests whose inputs changed are run again (memote's "exclusive" option), and their fresh results are
+      merged with the cached ones into the same results.json schema
+The parts of the model are hashed from the cobra model rather than the SBML, as the metaids change every build.
+Tests that are not in TEST_COMPONENTS, such as the biomass, flux and consistency tests, read the whole model.
+"""
 import json
-from memote.suite.api import test_model
-import cobra
-model = cobra.io.read_sbml_model("WormJam.xml")
-code, results = test_model(model,sbml_version=(3,1),results=True,skip=["test_consistency"])
-with open("results.json","w+") as f:
-    f.write(json.dumps(results,indent=4))
\ No newline at end of file
+import os
+import shutil
+
+from build_cache import digest
+
+FINGERPRINT_NAME = "WormJam.xml.fingerprint"
+MEMOTE_CACHE = ".build_cache/memote" #results of earlier runs, keyed on the build fingerprint
+TEST_CACHE = os.path.join(MEMOTE_CACHE,"tests.json") #result of every test, keyed on the components it reads
+
+# parts of the model a test reads:test names
+TEST_COMPONENTS = {
+    ("model",):["test_model_id_presence","test_sbml_level","test_fbc_presence"],
+    ("compartments",):["test_compartments_presence"],
+    ("metabolites",):["test_metabolites_presence","test_metabolites_formula_presence","test_metabolites_charge_presence"],
+    ("reactions",):["test_reactions_presence"],
+    ("genes",):["test_genes_presence"],
+    ("reactions","gprs"):["test_gene_protein_reaction_rule_presence","test_protein_complex_presence"],
+    ("reactions","gprs","genes"):["test_metabolic_coverage","test_find_reactions_with_identical_genes"],
+    ("metabolites","metabolite_annotations"):[
+        "test_metabolite_annotation_presence","test_metabolite_annotation_overview",
+        "test_metabolite_annotation_wrong_ids","test_metabolite_id_namespace_consistency",
+        "test_metabolite_sbo_presence","test_metabolite_specific_sbo_presence",
+        "test_find_duplicate_metabolites_in_compartments"],
+    ("reactions","reaction_annotations"):[
+        "test_reaction_annotation_presence","test_reaction_annotation_overview",
+        "test_reaction_annotation_wrong_ids","test_reaction_id_namespace_consistency",
+        "test_reaction_sbo_presence","test_find_reactions_with_partially_identical_annotations"],
+    ("genes","gene_annotations"):[
+        "test_gene_product_annotation_presence","test_gene_product_annotation_overview",
+        "test_gene_product_annotation_wrong_ids","test_gene_sbo_presence","test_gene_specific_sbo_presence"],
+}
+COMPONENTS_OF_TEST = {test:components for components,tests in TEST_COMPONENTS.items() for test in tests}
+
+
+def _annotation(obj):
+    """Helper function to get an annotation in a fixed order"""
+    return sorted((key,repr(val)) for key,val in obj.annotation.items())
+
+def model_components(model):
+    """Function to hash the parts of a cobra model the memote tests read
+
+    Names and notes are left out, as no test checks them.
+
+        Returns:
+            dict -- component:hash
+    """
+    return {
+        "model":digest(model.id,_annotation(model)),
+        "compartments":digest(sorted(model.compartments.items())),
+        "metabolites":digest([(met.id,met.formula,met.charge,met.compartment) for met in model.metabolites]),
+        "metabolite_annotations":digest([(met.id,_annotation(met)) for met in model.metabolites]),
+        "reactions":digest([(rxn.id,sorted((met.id,coefficient) for met,coefficient in rxn.metabolites.items()),rxn.lower_bound,rxn.upper_bound,rxn.objective_coefficient) for rxn in model.reactions]),
+        "reaction_annotations":digest([(rxn.id,_annotation(rxn)) for rxn in model.reactions]),
+        "gprs":digest([(rxn.id,rxn.gene_reaction_rule) for rxn in model.reactions]),
+        "genes":digest([gene.id for gene in model.genes]),
+        "gene_annotations":digest([(gene.id,_annotation(gene)) for gene in model.genes]),
+        "groups":digest([(group.id,sorted(member.id for member in group.members)) for group in model.groups]),
+    }
+
+def cache_key(test,components,version):
+    """Function to get the cache key of a test, from the hashes of the components it reads and the memote version"""
+    names = COMPONENTS_OF_TEST.get(test,sorted(components))
+    return digest(version,test,[components[name] for name in names])
+
+def _cacheable(entry):
+    """Helper function to check that a test result is worth reusing, errors may be solver timeouts and the like"""
+    outcome = entry.get("result")
+    outcomes = outcome.values() if isinstance(outcome,dict) else [outcome] #parametrized tests have a result per parameter
+    return "error" not in outcomes
+
+def load_test_cache(version,filename=TEST_CACHE):
+    """Function to read the cached test results of a memote version, or none if there are none"""
+    empty = {"version":version,"meta":None,"tests":{}}
+    if not os.path.isfile(filename):
+        return empty
+    try:
+        with open(filename) as f:
+            cache = json.load(f)
+    except ValueError as e:
+        print("memote test cache could not be read, running every test:",e)
+        return empty
+    if cache.get("version") != version: #other versions may have other tests
+        return empty
+    return cache
+
+def run_tests(model,cache):
+    """Function to run the memote tests whose inputs changed since they were cached
+
+        Arguments:
+            model {cobra.Model} -- model to test
+            cache {dict} -- cached results from load_test_cache, updated with the fresh results
+
+        Returns:
+            dict -- results in the memote results.json schema
+    """
+    components = model_components(model)
+    keys = {test:cache_key(test,components,cache["version"]) for test in cache["tests"]}
+    hits = [test for test,key in keys.items() if cache["tests"][test]["key"] == key]
+    stale = [test for test in keys if test not in hits]
+    if cache["meta"] is not None and not stale:
+        print("All %d memote tests reused from the cache"%len(hits))
+        return {"meta":cache["meta"],"tests":{test:cache["tests"][test]["result"] for test in hits}}
+    from memote.suite.api import test_model
+    if cache["meta"] is None: #first run, the test names are only known from the results
+        print("Running every memote test")
+        code,results = test_model(model,sbml_version=(3,1),results=True,skip=["test_consistency"])
+    else:
+        print("Running %d memote tests, %d reused from the cache: %s"%(len(stale),len(hits),", ".join(stale)))
+        code,results = test_model(model,sbml_version=(3,1),results=True,exclusive=stale,skip=["test_consistency"])
+    results = json.loads(json.dumps(results)) #plain dictionaries, as in results.json
+    for test in hits: #tests outside the exclusive list are reported as skipped
+        results["tests"][test] = cache["tests"][test]["result"]
+    cache["meta"] = results["meta"]
+    for test,entry in results["tests"].items():
+        if test in hits:
+            continue
+        #every test is remembered, so it is run again next time if its result is not reused
+        cache["tests"][test] = {"key":cache_key(test,components,cache["version"]) if _cacheable(entry) else None,"result":entry}
+    return results
+
+def write_test_cache(cache,filename=TEST_CACHE):
+    """Function to store the test results for the next run"""
+    os.makedirs(os.path.dirname(filename),exist_ok=True)
+    with open(filename+".tmp","w") as f:
+        json.dump(cache,f)
+    os.replace(filename+".tmp",filename)
+
+
+if __name__ == "__main__":
+    fingerprint = None
+    if os.path.isfile(FINGERPRINT_NAME):
+        with open(FINGERPRINT_NAME) as f:
+            fingerprint = f.read().strip()
+    cached = os.path.join(MEMOTE_CACHE,fingerprint+".json") if fingerprint else None
+
+    if cached is not None and os.path.isfile(cached):
+        print("Model unchanged since the last memote run, reusing",cached)
+        shutil.copyfile(cached,"results.json")
+    else:
+        import cobra
+        import memote
+        model = cobra.io.read_sbml_model("WormJam.xml")
+        cache = load_test_cache(memote.__version__)
+        results = run_tests(model,cache)
+        write_test_cache(cache)
+        with open("results.json","w+") as f:
+            f.write(json.dumps(results,indent=4))
+        if cached is not None:
+            os.makedirs(MEMOTE_CACHE,exist_ok=True)
+            shutil.copyfile("results.json",cached)
@@ -0,0 +1,86 @@
+from lxml import etree
+
+
+class SBMLStreamWriter():
+    """Class for writing an SBML document to disk one element at a time
+
+    The output is identical to building the whole document as one lxml tree and
+    serializing it with pretty_print=True (the SBML we write has no mixed content), but only a single entity (a gene, a
+    reaction...) is held in memory at once.
+
+        Arguments:
+            file {file} -- binary file object to write to
+            nsmap {dict} -- namespace map of the document, declared on the root element
+
+        Keyword Arguments:
+            space {str} -- whitespace used for one level of indentation (default: {"  "})
+    """
+
+    def __init__(self,file,nsmap,space="  "):
+        """Initialization function"""
+        self.file = file
+        self.nsmap = nsmap
+        self.space = space.encode()
+        self.depth = 0
+        self._pending = None #start tag that has not been written yet, so empty elements can be self closed
+        self._closing = [] #stack of closing tags for the open elements
+        #namespace declarations lxml adds to every standalone element, only kept on the root
+        self._ns_decl = etree.tostring(etree.Element("_",nsmap=nsmap))[2:-2]
+
+    def Element(self,tag,attrib=None,**extra):
+        """Function to create a standalone element that uses the document namespaces"""
+        return etree.Element(tag,attrib,nsmap=self.nsmap,**extra)
+
+    def write_declaration(self):
+        """Function to write the xml declaration"""
+        self.file.write(b"<?xml version='1.0' encoding='UTF-8' standalone='no'?>\n")
+
+    def _flush(self):
+        """Helper function to write a pending start tag once it is known to have children"""
+        if self._pending is not None:
+            self.file.write(self._pending+b">\n")
+            self._pending = None
+
+    def _serialize(self,element):
+        """Helper function to serialize an element without the repeated namespace declarations"""
+        text = etree.tostring(element,encoding="UTF-8",xml_declaration=False,with_tail=False)
+        if self.depth > 0:
+            text = text.replace(self._ns_decl,b"",1)
+        return text
+
+    def start(self,element):
+        """Function to open an element, everything written until the matching end() becomes its children
+
+        The element passed in must not have children of its own.
+        """
+        self._flush()
+        text = self._serialize(element)
+        assert text.endswith(b"/>"),"Only empty elements can be opened"
+        tag = text[1:].split(b" ",1)[0].rstrip(b"/>")
+        self._pending = self.space*self.depth+text[:-2]
+        self._closing.append(self.space*self.depth+b"</"+tag+b">\n")
+        self.depth += 1
+
+    def end(self):
+        """Function to close the most recently opened element"""
+        self.depth -= 1
+        closing = self._closing.pop()
+        if self._pending is not None: #no children were written, so self close
+            self.file.write(self._pending+b"/>\n")
+            self._pending = None
+        else:
+            self.file.write(closing)
+
+    def fragment(self,element):
+        """Function to serialize a complete element as it would be written at the current depth"""
+        etree.indent(element,space=self.space.decode(),level=self.depth)
+        return self.space*self.depth+self._serialize(element)+b"\n"
+
+    def write_fragment(self,fragment):
+        """Function to write an already serialized element, as returned by fragment()"""
+        self._flush()
+        self.file.write(fragment)
+
+    def write(self,element):
+        """Function to write a complete element at the current depth"""
+        self.write_fragment(self.fragment(element))
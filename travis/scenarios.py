@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""Batch FBA scenario engine
+
+Evaluates a table of growth scenarios (media, knockouts, objectives) in a pool of worker processes.
+Every worker builds the cobra model from the curation tables once, then applies each scenario
+within a `with model:` block so it is undone before the next one.
+
+Usage:
+    python travis/scenarios.py travis/Scenario-SBtab.tsv
+    python travis/scenarios.py travis/Scenario-SBtab.tsv --screen genes --base basic_growth
+    python travis/scenarios.py travis/Scenario-SBtab.tsv --screen dropout --base basic_growth --workers 4
+
+Gene knockouts of a screen are turned into the reactions they disable for all scenarios at once (see
+knockouts.py), and scenarios that end up identical, e.g. deletions that disable no reaction, are solved once.
+
+Scenario table columns (SBtab, lists are separated by |):
+    !ID                 -- scenario name
+    !Objective          -- reaction to maximise (default: BIO0100)
+    !CloseMedium        -- TRUE to close every exchange before applying !Medium
+    !Medium             -- exchange:bound pairs added to the medium, e.g. O2_Exchange_reactions_e:1000
+    !GeneKnockouts      -- genes to knock out
+    !ReactionKnockouts  -- reactions to knock out
+    !Expect             -- "growth", "no growth" or blank for no expectation
+"""
+import argparse
+import csv
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from cobra_model import build_cobra_model,clip
+from helper_classes import SBtable,load_quietly
+from knockouts import circuit_of
+
+DEFAULT_OBJECTIVE = "BIO0100"
+COLUMNS = ["!Objective","!CloseMedium","!Medium","!GeneKnockouts","!ReactionKnockouts","!Expect"]
+
+_model = None #model of the current worker process
+
+
+def _split(cell):
+    """Helper function to split a | separated cell"""
+    return [i.strip() for i in cell.split("|") if i.strip() != ""]
+
+def load_scenarios(filename):
+    """Function to read a scenario table into a dictionary of ID:scenario"""
+    table = SBtable(filename)
+    return {key:{column:val.get(column,"") for column in COLUMNS} for key,val in table.data.items()}
+
+def single_gene_deletions(base,genes):
+    """Function to generate one scenario per gene, each knocking out that gene on top of the base scenario"""
+    screen = {}
+    for gene in genes:
+        scenario = dict(base)
+        scenario["!GeneKnockouts"] = "|".join(_split(base["!GeneKnockouts"])+[gene])
+        scenario["!Expect"] = ""
+        screen["delete_"+gene] = scenario
+    return screen
+
+def nutrient_dropouts(base,exchanges):
+    """Function to generate one scenario per exchange, each closing that exchange on top of the base scenario"""
+    screen = {}
+    for exchange in exchanges:
+        scenario = dict(base)
+        scenario["!Medium"] = "|".join(_split(base["!Medium"])+[exchange+":0"])
+        scenario["!Expect"] = ""
+        screen["dropout_"+exchange] = scenario
+    return screen
+
+def reaction_knockouts(scenarios,circuit):
+    """Function to replace the gene knockouts of scenarios by the reactions they disable
+
+        Arguments:
+            scenarios {dict} -- ID:scenario
+            circuit {GPRCircuit} -- compiled gene associations, evaluated for every scenario in one pass
+
+        Returns:
+            dict -- ID:scenario with !ReactionKnockouts instead of !GeneKnockouts
+    """
+    disabled = circuit.disabled(circuit.knockout_matrix([_split(scenario["!GeneKnockouts"]) for scenario in scenarios.values()]))
+    converted = {}
+    for (key,scenario),row in zip(scenarios.items(),disabled):
+        scenario = dict(scenario)
+        scenario["!ReactionKnockouts"] = "|".join(_split(scenario["!ReactionKnockouts"])+[clip(rxn,"R_") for rxn in circuit.reactions[row]])
+        scenario["!GeneKnockouts"] = ""
+        converted[key] = scenario
+    return converted
+
+def _init_worker(folder,snapshot):
+    """Function run once in every worker process to build its model"""
+    global _model
+    _model = build_cobra_model(load_quietly(folder,snapshot=snapshot))
+
+def apply_scenario(model,scenario):
+    """Function to apply a scenario to a model, must be called within a `with model:` block"""
+    model.objective = model.reactions.get_by_id(scenario["!Objective"] or DEFAULT_OBJECTIVE)
+    medium = model.medium
+    if scenario["!CloseMedium"].lower() == "true":
+        for i in medium:
+            medium[i] = 0
+    for item in _split(scenario["!Medium"]):
+        exchange,bound = item.rsplit(":",1)
+        medium[exchange] = float(bound)
+    model.medium = medium
+    for gene in _split(scenario["!GeneKnockouts"]):
+        model.genes.get_by_id(gene).knock_out()
+    for reaction in _split(scenario["!ReactionKnockouts"]):
+        model.reactions.get_by_id(reaction).knock_out()
+
+def evaluate(model,key,scenario):
+    """Function to evaluate a single scenario, returning a result dictionary"""
+    with model:
+        try:
+            apply_scenario(model,scenario)
+            value = model.slim_optimize(error_value=float("nan"))
+            status = model.solver.status
+        except (KeyError,ValueError) as e: #unknown IDs or malformed cells
+            value = float("nan")
+            status = "invalid: "+str(e)
+    grows = not math.isnan(value) and abs(value) > model.tolerance
+    expect = scenario["!Expect"].lower()
+    passed = "" if expect == "" else str((expect == "growth") == grows).upper()
+    return {"!ID":key,"!ObjectiveValue":value,"!Status":status,"!Expect":scenario["!Expect"],"!Passed":passed}
+
+def _evaluate_in_worker(item):
+    """Helper function to evaluate a scenario on the model of the worker process"""
+    return evaluate(_model,*item)
+
+def run_scenarios(scenarios,folder="curation",snapshot=".build_cache/tables.pickle",workers=None,chunksize=8):
+    """Function to evaluate many scenarios in parallel
+
+        Arguments:
+            scenarios {dict} -- ID:scenario, as from load_scenarios
+
+        Keyword Arguments:
+            folder {str} -- curation folder to build the model from (default: {"curation"})
+            snapshot {str} -- table snapshot used by the workers to load the folder quickly (default: {".build_cache/tables.pickle"})
+            workers {int} -- number of worker processes, defaults to the number of CPUs (default: {None})
+            chunksize {int} -- scenarios sent to a worker at a time (default: {8})
+
+        Returns:
+            list -- result dictionaries, in the order of the scenarios
+    """
+    if snapshot is not None:
+        load_quietly(folder,snapshot=snapshot) #write the snapshot once, rather than in every worker
+    unique = {} #identical scenarios are only evaluated once
+    for key,scenario in scenarios.items():
+        unique.setdefault(tuple(scenario[column] for column in COLUMNS),key)
+    with ProcessPoolExecutor(max_workers=workers,initializer=_init_worker,initargs=(folder,snapshot)) as executor:
+        evaluated = {result["!ID"]:result for result in executor.map(_evaluate_in_worker,((key,scenarios[key]) for key in unique.values()),chunksize=chunksize)}
+    return [dict(evaluated[unique[tuple(scenario[column] for column in COLUMNS)]],**{"!ID":key}) for key,scenario in scenarios.items()]
+
+def write_results(results,filename):
+    """Function to write the results as an SBtab table"""
+    with open(filename,"w",newline="") as f:
+        writer = csv.writer(f,delimiter="\t")
+        writer.writerow(["!!SBtab SBtabVersion='1.0' TableType='ScenarioResult' TableName='FBA scenario results'"])
+        headers = ["!ID","!ObjectiveValue","!Status","!Expect","!Passed"]
+        writer.writerow(headers)
+        for result in results:
+            writer.writerow([result[header] for header in headers])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate FBA scenarios in parallel")
+    parser.add_argument("scenarios",help="scenario SBtab file")
+    parser.add_argument("--screen",choices=["genes","dropout"],help="run a single gene deletion or nutrient dropout screen on top of --base instead")
+    parser.add_argument("--base",help="ID of the scenario the screen is based on")
+    parser.add_argument("--folder",default="curation",help="curation folder")
+    parser.add_argument("--workers",type=int,default=None,help="number of worker processes")
+    parser.add_argument("--output",default="scenario_results.tsv",help="results file")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.scenarios)
+    if args.screen is not None:
+        if args.base not in scenarios:
+            print("--base must be one of:",", ".join(scenarios))
+            exit(1)
+        _init_worker(args.folder,".build_cache/tables.pickle")
+        if args.screen == "genes":
+            scenarios = reaction_knockouts(single_gene_deletions(scenarios[args.base],[gene.id for gene in _model.genes]),circuit_of(load_quietly(args.folder,snapshot=".build_cache/tables.pickle")))
+        else:
+            with _model:
+                apply_scenario(_model,scenarios[args.base])
+                exchanges = list(_model.medium)
+            scenarios = nutrient_dropouts(scenarios[args.base],exchanges)
+    print("Evaluating",len(scenarios),"scenarios")
+    results = run_scenarios(scenarios,folder=args.folder,workers=args.workers)
+    write_results(results,args.output)
+    failed = [result["!ID"] for result in results if result["!Passed"] == "FALSE"]
+    print(len(results),"scenarios evaluated,",len(failed),"failed expectations")
+    for key in failed:
+        print("Failed:",key)
+    if failed:
+        sys.exit(1)
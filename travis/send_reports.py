@@ -11,10 +11,10 @@ TRAVIS_BUILD_WEB_URL = sys.argv[4]
 TRAVIS_REPO_SLUG = sys.argv[5]
 
 timestamp = datetime.datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
-filename = "WormJam"+timestamp+".tar.gz"
+filename = "WormJam"+timestamp+".xml.gz"
 
 files = {'Report.html': open('Report.html', 'rb')}
-files2 = {filename:open("WormJam.tar.gz",'rb')}
+files2 = {filename:open("WormJam.xml.gz",'rb')}
 payload_json = {
     "embeds": [{
         "title": "WormJam CI Report",
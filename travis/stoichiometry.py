@@ -0,0 +1,57 @@
+import numpy as np
+from scipy import sparse
+
+
+class Stoichiometry():
+    """Sparse stoichiometric matrix (metabolites x reactions) of a ModelSystem, built from the parsed reaction formulas
+
+    Reactants are negative and products positive, a metabolite on both sides gets its net coefficient.
+    Rows follow the Compound table, followed by any metabolite used in a reaction but missing from it.
+    Columns follow the Reaction table.
+
+        Arguments:
+            model {ModelSystem} -- model with the Reaction and Compound tables loaded
+
+    instance.matrix = scipy.sparse.csc_matrix of stoichiometric coefficients\n
+    instance.metabolites, instance.reactions = numpy arrays of the row and column IDs\n
+    instance.metabolite_index, instance.reaction_index = dictionaries of ID:row/column number\n
+    instance.missing = numpy array of the metabolites used in reactions but not in the Compound table\n
+    instance.invalid = list of (reaction, metabolite, coefficient) left out because the coefficient is not a number
+    """
+
+    def __init__(self,model):
+        """Builds the matrix in a single pass over the reaction formulas"""
+        formulas = model.index.reaction_formulas
+        self.metabolite_index = {met:i for i,met in enumerate(model.tables.get("Compound").data)}
+        n_compounds = len(self.metabolite_index)
+        self.reaction_index = {rxn:j for j,rxn in enumerate(formulas)}
+        self.invalid = []
+        rows = []
+        cols = []
+        values = []
+        for rxn,(reactants,products) in formulas.items():
+            j = self.reaction_index[rxn]
+            for side,sign in ((reactants,-1.0),(products,1.0)):
+                for met,coefficient in side.items():
+                    if met == "": #empty side of the reaction, e.g. exchanges
+                        continue
+                    try:
+                        value = sign*float(coefficient)
+                    except ValueError:
+                        self.invalid.append((rxn,met,coefficient))
+                        continue
+                    rows.append(self.metabolite_index.setdefault(met,len(self.metabolite_index)))
+                    cols.append(j)
+                    values.append(value)
+        self.metabolites = np.array(list(self.metabolite_index),dtype=object)
+        self.reactions = np.array(list(self.reaction_index),dtype=object)
+        self.missing = self.metabolites[n_compounds:]
+        #duplicate entries are summed when converting, giving the net coefficient
+        self.matrix = sparse.coo_matrix((np.array(values,dtype=float),(np.array(rows,dtype=np.int32),np.array(cols,dtype=np.int32))),shape=(len(self.metabolites),len(self.reactions))).tocsc()
+        self.matrix.eliminate_zeros()
+
+    def column(self,reaction):
+        """Function to get the metabolite:coefficient dictionary of one reaction"""
+        j = self.reaction_index[reaction]
+        start,end = self.matrix.indptr[j],self.matrix.indptr[j+1]
+        return {self.metabolites[i]:value for i,value in zip(self.matrix.indices[start:end],self.matrix.data[start:end])}
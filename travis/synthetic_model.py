@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""Generator of synthetic SBtab folders for scaling tests
+
+Writes a model of any size with the Compartment, Compound, Reaction, Gene, Pathway, Database and Curator
+tables, shaped like a real model (by default the curation folder):
+    - every synthetic compound, gene, pathway and reaction is modelled on an entity of the real model,
+      keeping its names, notes and annotations, so cell lengths and annotation density are realistic
+    - reaction formulas keep the sides, stoichiometries and compartments of the real formula, with every
+      metabolite replaced by a compound of the same compartment, drawn in proportion to the number of
+      reactions the real compound takes part in, so hub metabolites stay hubs
+    - gene associations keep the structure of the real association, with genes drawn from a pool the size of
+      the real active genes scaled up, and more (or fewer) isozymes and complex subunits at higher (or lower)
+      GPR complexity
+    - reactions with a pathway are put in one of the copies of their real pathway
+Entity i is modelled on real entity i modulo the size of the real table, so integer scales keep the real
+distributions exactly. The same seed always gives the same folder.
+
+Usage:
+    python travis/synthetic_model.py synthetic --scale 10
+    python travis/synthetic_model.py synthetic --scale 100 --gpr-complexity 2 --seed 1
+"""
+import argparse
+import csv
+import os
+import random
+from itertools import accumulate
+
+import gpr
+from helper_classes import load_quietly
+
+COPIED_TABLES = ["Compartment","Database","Curator"]
+
+
+def _copy_id(key,copy,separator="_"):
+    """Helper function to get the ID of a copy of an entity, the first copy keeps the real ID"""
+    return key if copy == 0 else key+separator+str(copy)
+
+def scale_gpr(node,complexity):
+    """Function to scale the number of isozymes ("or") and complex subunits ("and") of a GPR tree
+
+    A single gene counts as one isozyme, so it becomes an "or" of several genes at complexity 2.
+    Leaves are kept as placeholders, to be replaced by generated genes.
+    """
+    if node[0] == "gene":
+        count = max(1,round(complexity))
+        return node if count == 1 else ("or",(node,)*count)
+    children = [scale_gpr(child,complexity) if child[0] != "gene" else child for child in node[1]]
+    count = max(1,round(len(children)*complexity))
+    children = [children[i%len(children)] for i in range(count)]
+    return children[0] if count == 1 else (node[0],tuple(children))
+
+
+class ModelTemplate():
+    """The tables of a real model that synthetic models are modelled on
+
+        Arguments:
+            folder {str} -- SBtab folder of the real model
+    """
+
+    def __init__(self,folder):
+        """Loads the folder and counts how many reactions every compound takes part in"""
+        compiler = load_quietly(folder,columnar=False)
+        self.tables = compiler.tables
+        missing = [name for name in ["Compartment","Compound","Reaction"] if name not in self.tables]
+        if missing:
+            raise ValueError("The template folder has no "+", ".join(missing)+" table")
+        self.degree = {met:len(compiler.index.reactions_of_metabolite(met)) for met in self.tables["Compound"].data}
+        self.active_genes = len(compiler.index.active_genes())
+
+    def rows(self,name):
+        """Function to list the (ID,entry) pairs of a table, or none if the model does not have it"""
+        return list(self.tables[name].data.items()) if name in self.tables else []
+
+
+class SyntheticModel():
+    """Generator of one synthetic model from a ModelTemplate
+
+        Arguments:
+            template {ModelTemplate} -- real model to model the tables on
+
+        Keyword Arguments:
+            scale {float} -- size of the model relative to the template (default: {1.0})
+            gpr_complexity {float} -- isozymes and complex subunits relative to the template (default: {1.0})
+            seed {int} -- seed of the random generator (default: {0})
+    """
+
+    def __init__(self,template,scale=1.0,gpr_complexity=1.0,seed=0):
+        """Initialization function"""
+        self.template = template
+        self.scale = scale
+        self.gpr_complexity = gpr_complexity
+        self.random = random.Random(seed)
+        self.counts = {}
+
+    def _count(self,name):
+        """Helper function to get the number of entities of a table at this scale"""
+        return max(1,round(len(self.template.rows(name))*self.scale)) if self.template.rows(name) else 0
+
+    def _entities(self,name,separator="_"):
+        """Helper function to list the (ID,template ID,template entry) of every synthetic entity of a table"""
+        rows = self.template.rows(name)
+        return [(_copy_id(rows[i%len(rows)][0],i//len(rows),separator),)+rows[i%len(rows)] for i in range(self._count(name))]
+
+    def _write(self,dest,name,entities,override=None):
+        """Helper function to write a table of entities, override(ID,template ID,entry) may change the cells of an entry"""
+        table = self.template.tables[name]
+        with open(os.path.join(dest,name+"-SBtab.tsv"),"w",encoding="latin-1",newline="") as f:
+            writer = csv.writer(f,delimiter="\t")
+            writer.writerow([table.sbString])
+            writer.writerow(table.headers)
+            for key,template_key,val in entities:
+                if override is not None:
+                    val = override(key,template_key,val)
+                writer.writerow([key]+[val.get(header,"") for header in table.headers[1:]])
+        self.counts[name] = len(entities)
+
+    def _compound_samplers(self,compounds):
+        """Helper function to group the compounds by location, with cumulative weights for drawing them"""
+        samplers = {}
+        for key,template_key,val in compounds:
+            ids,weights = samplers.setdefault(val["!Location"],([],[]))
+            ids.append(key)
+            weights.append(self.template.degree[template_key]+1)
+        return {location:(ids,list(accumulate(weights))) for location,(ids,weights) in samplers.items()}
+
+    def _formula(self,formula,samplers,locations):
+        """Helper function to replace every metabolite of a real formula with a compound of the same compartment"""
+        replaced = {}
+        for word in formula.split(" "):
+            if word in locations and word not in replaced:
+                ids,weights = samplers[locations[word]]
+                for attempt in range(10): #a metabolite should only appear once in a reaction
+                    met = self.random.choices(ids,cum_weights=weights)[0]
+                    if met not in replaced.values():
+                        break
+                replaced[word] = met
+        return " ".join(replaced.get(word,word) for word in formula.split(" "))
+
+    def _gene_association(self,rule,genes):
+        """Helper function to generate a gene association with the structure of a real one"""
+        try:
+            node = gpr.parse_gpr(rule)
+        except ValueError: #malformed, leave the reaction without genes
+            return ""
+        if node is None or not genes:
+            return ""
+        node = scale_gpr(node,self.gpr_complexity)
+        def fill(node):
+            if node[0] == "gene":
+                return ("gene",self.random.choice(genes))
+            return (node[0],tuple(fill(child) for child in node[1]))
+        return gpr.to_string(fill(node))
+
+    def write(self,dest):
+        """Function to write the synthetic model to a folder
+
+            Returns:
+                dict -- table name:number of entries written
+        """
+        os.makedirs(dest,exist_ok=True)
+        for name in COPIED_TABLES:
+            if name in self.template.tables:
+                self._write(dest,name,[(key,key,val) for key,val in self.template.rows(name)])
+
+        compounds = self._entities("Compound")
+        self._write(dest,"Compound",compounds)
+        samplers = self._compound_samplers(compounds)
+        locations = {key:val["!Location"] for key,val in self.template.tables["Compound"].data.items() if val["!Location"] in samplers}
+
+        genes = self._entities("Gene")
+        if genes:
+            self._write(dest,"Gene",genes)
+        pool = self.random.sample([key for key,template_key,val in genes],min(len(genes),round(self.template.active_genes*self.scale)))
+
+        pathways = self._entities("Pathway",separator=" ")
+        if pathways:
+            self._write(dest,"Pathway",pathways)
+        copies = {}
+        for key,template_key,val in pathways:
+            copies.setdefault(template_key,[]).append(key)
+
+        def reaction(key,template_key,val):
+            """Function to give a reaction a new formula, gene association and pathway"""
+            val = dict(val)
+            val["!ReactionFormula"] = self._formula(val["!ReactionFormula"],samplers,locations)
+            val["!GeneAssociation"] = self._gene_association(val["!GeneAssociation"],pool)
+            if val.get("!Pathway","") != "":
+                val["!Pathway"] = self.random.choice(copies[val["!Pathway"]]) if val["!Pathway"] in copies else val["!Pathway"]
+            return val
+        self._write(dest,"Reaction",self._entities("Reaction"),reaction)
+        return dict(self.counts)
+
+
+def generate(dest,source="curation",scale=1.0,gpr_complexity=1.0,seed=0):
+    """Function to write a synthetic SBtab folder modelled on a real one, see SyntheticModel
+
+        Returns:
+            dict -- table name:number of entries written
+    """
+    return SyntheticModel(ModelTemplate(source),scale,gpr_complexity,seed).write(dest)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic SBtab folder modelled on a real model")
+    parser.add_argument("dest",help="folder to write the tables to")
+    parser.add_argument("--source",default="curation",help="SBtab folder the model is modelled on")
+    parser.add_argument("--scale",type=float,default=1.0,help="size relative to the source model")
+    parser.add_argument("--gpr-complexity",type=float,default=1.0,help="isozymes and complex subunits relative to the source model")
+    parser.add_argument("--seed",type=int,default=0,help="seed of the random generator")
+    args = parser.parse_args()
+
+    counts = generate(args.dest,args.source,args.scale,args.gpr_complexity,args.seed)
+    for name,count in counts.items():
+        print("%s: %d entries"%(name,count))
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""Structural analysis of the metabolite-reaction network of the curation tables
+
+A fast stand-in for the memote consistency tests skipped in CI, found from the stoichiometric matrix and
+!IsReversible alone, without solving any LP:
+    orphans      -- metabolites no reaction can produce
+    dead ends    -- metabolites no reaction can consume
+    disconnected -- compounds in no reaction at all
+    blocked      -- reactions that can never carry a steady-state flux, as they use a metabolite that cannot
+                    be both produced and consumed. Blocking a reaction can leave further metabolites without a
+                    producer or consumer, so this is propagated with sparse matrix products until nothing changes
+    components   -- groups of reactions and metabolites not connected to the main network
+Boundary reactions (an empty side of the formula) produce or consume their metabolite like any other reaction.
+Flux variability analysis finds more blocked reactions, as it also accounts for the coefficients.
+
+The report is in the format of the memote results, and can be merged into results.json for the curation report.
+
+Usage:
+    python travis/topology.py
+    python travis/topology.py curation --json topology.json
+    python travis/topology.py --merge results.json
+"""
+import argparse
+import json
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+
+class Topology():
+    """Structural analysis of the network of a ModelSystem
+
+        Arguments:
+            model {ModelSystem} -- model with the Reaction and Compound tables loaded
+
+    instance.produces, instance.consumes = sparse boolean matrices (metabolites x reactions) of the metabolites
+    every reaction can make or use, in either direction if it is reversible
+    """
+
+    def __init__(self,model):
+        """Builds the production and consumption matrices from the stoichiometric matrix"""
+        stoichiometry = model.stoichiometry
+        self.metabolites = stoichiometry.metabolites
+        self.reactions = stoichiometry.reactions
+        self.compounds = len(model.tables.get("Compound").data)
+        reversible = model.tables.get("Reaction").column("!IsReversible")
+        self.reversible = np.array([reversible[key].lower() == "true" for key in self.reactions])
+        matrix = stoichiometry.matrix
+        forward = (matrix > 0).astype(np.int32)
+        backward = (matrix < 0).astype(np.int32)
+        both = sparse.diags(self.reversible.astype(np.int32),dtype=np.int32)
+        self.produces = (forward+backward@both).tocsr()
+        self.consumes = (backward+forward@both).tocsr()
+        self.incidence = (forward+backward).tocsr()
+
+    def orphans(self):
+        """Function to list the metabolites no reaction can produce"""
+        used = np.asarray(self.incidence.sum(axis=1)).ravel() > 0
+        return list(self.metabolites[used & (np.asarray(self.produces.sum(axis=1)).ravel() == 0)])
+
+    def dead_ends(self):
+        """Function to list the metabolites no reaction can consume"""
+        used = np.asarray(self.incidence.sum(axis=1)).ravel() > 0
+        return list(self.metabolites[used & (np.asarray(self.consumes.sum(axis=1)).ravel() == 0)])
+
+    def disconnected(self):
+        """Function to list the compounds of the Compound table in no reaction"""
+        unused = np.asarray(self.incidence.sum(axis=1)).ravel()[:self.compounds] == 0
+        return list(self.metabolites[:self.compounds][unused])
+
+    def blocked(self):
+        """Function to find the reactions that can never carry flux
+
+        A metabolite can only be at steady state if an active reaction produces it, another or the same one
+        consumes it, and it is in at least two active reactions. Reactions using any other metabolite are
+        blocked, which is repeated until no more reactions are blocked.
+
+            Returns:
+                tuple -- blocked reactions, and metabolites left without a producer or consumer
+        """
+        active = np.ones(len(self.reactions),dtype=np.int32)
+        while True:
+            producers = self.produces@active
+            consumers = self.consumes@active
+            degree = self.incidence@active
+            dead = (degree > 0) & ((producers == 0) | (consumers == 0) | (degree < 2))
+            blocked = (self.incidence.T@dead.astype(np.int32) > 0) & (active > 0)
+            if not blocked.any():
+                break
+            active[blocked] = 0
+        return list(self.reactions[active == 0]),list(self.metabolites[dead | ((np.asarray(self.incidence.sum(axis=1)).ravel() > 0) & (degree == 0))])
+
+    def components(self):
+        """Function to find the groups of reactions and metabolites not connected to the largest one
+
+            Returns:
+                list -- dictionaries of the reactions and metabolites of every group, largest first
+        """
+        n_metabolites = len(self.metabolites)
+        graph = sparse.bmat([[None,self.incidence],[self.incidence.T,None]]) #bipartite graph, metabolites then reactions
+        count,labels = connected_components(graph,directed=False)
+        reaction_labels = labels[n_metabolites:]
+        sizes = np.bincount(reaction_labels,minlength=count)
+        groups = []
+        for label in np.argsort(-sizes,kind="stable")[1:]:
+            if sizes[label] == 0: #compounds in no reaction, see disconnected
+                continue
+            groups.append({
+                "reactions":list(self.reactions[reaction_labels == label]),
+                "metabolites":list(self.metabolites[labels[:n_metabolites] == label])
+            })
+        return groups
+
+    def report(self):
+        """Function to run every analysis, as memote test results
+
+            Returns:
+                dict -- test name:result, in the schema of the tests of the memote results.json
+        """
+        blocked,dead = self.blocked()
+        components = self.components()
+        n_metabolites = len(self.metabolites)
+        n_reactions = len(self.reactions)
+        return {
+            "test_find_orphans":memote_result("Orphan Metabolites","Metabolites that are only consumed, no reaction can produce them.",self.orphans(),n_metabolites),
+            "test_find_deadends":memote_result("Dead-end Metabolites","Metabolites that are only produced, no reaction can consume them.",self.dead_ends(),n_metabolites),
+            "test_find_disconnected":memote_result("Disconnected Metabolites","Compounds of the Compound table that are not part of any reaction.",self.disconnected(),n_metabolites),
+            "test_structurally_blocked_reactions":memote_result("Structurally Blocked Reactions","Reactions that cannot carry flux at steady state, as they use a metabolite that cannot be both produced and consumed, directly or through other blocked reactions. Found from the network structure, without solving any LP.",blocked,n_reactions),
+            "test_structurally_dead_metabolites":memote_result("Structurally Dead Metabolites","Metabolites that cannot be both produced and consumed once the blocked reactions are removed.",dead,n_metabolites),
+            "test_find_disconnected_components":memote_result("Disconnected Subnetworks","Groups of reactions not connected to the main network through any metabolite.",components,n_reactions,sum(len(group["reactions"]) for group in components)),
+        }
+
+
+def memote_result(title,summary,data,total,count=None):
+    """Helper function to describe a list of problems as a memote test result"""
+    count = len(data) if count is None else count
+    return {
+        "title":title,
+        "summary":summary,
+        "format_type":"count",
+        "data":data,
+        "metric":count/total if total else 0.0,
+        "result":"passed" if count == 0 else "failed",
+        "message":"%d of %d (%.2f%%)"%(count,total,100*count/total if total else 0.0)
+    }
+
+def merge_results(report,filename="results.json"):
+    """Function to add the tests of a report to a memote results.json, replacing earlier runs of them"""
+    with open(filename) as f:
+        results = json.load(f)
+    results["tests"].update(report)
+    with open(filename,"w") as f:
+        f.write(json.dumps(results,indent=4))
+
+
+if __name__ == "__main__":
+    import time
+
+    from helper_classes import load_quietly
+
+    parser = argparse.ArgumentParser(description="Find dead ends, disconnected parts and blocked reactions of the WormJam network")
+    parser.add_argument("folder",nargs="?",default="curation",help="SBtab folder to analyse")
+    parser.add_argument("--json",default=None,metavar="FILE",help="write the report to FILE")
+    parser.add_argument("--merge",default=None,metavar="FILE",help="add the report to the tests of a memote results.json")
+    args = parser.parse_args()
+
+    compiler = load_quietly(args.folder)
+    start = time.perf_counter()
+    report = Topology(compiler).report()
+    seconds = time.perf_counter()-start
+    for test,result in report.items():
+        print("%s: %s"%(result["title"],result["message"]))
+    print("Analysed in %.3fs"%seconds)
+    if args.json is not None:
+        with open(args.json,"w") as f:
+            json.dump(report,f,indent=4)
+    if args.merge is not None:
+        merge_results(report,args.merge)
@@ -1,26 +1,37 @@
 #!/usr/bin/env python
 
+import argparse
 import csv
 import datetime
+import io
 import json
 import os
-import sys
+import time
+import traceback
 import uuid
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 
-import pyparsing
 import requests
 from lxml import etree
 
-from helper_classes import ModelSystem
+from build_cache import FragmentCache,digest,module_paths
+import export
+from gpr import parse_gpr
+from helper_classes import ModelSystem,read_headers,resolve_folder,version_folders
+from profiler import StageProfiler
+from sbml_writer import SBMLStreamWriter
+import validation
 
 OUTPUT_NAME = "WormJam.xml"
 BUILD = True
 CLEAN_DELETION = False
-
-# ## Comment out these two lines for local builds of the model
-DISCORD_ENDPOINT = sys.argv[1] #Discord Webhook endpoint, passed from Travis-CI
-TRAVIS_BUILD_NUMBER = sys.argv[2] #Travis Build Number, passed from Travis-CI
+INCREMENTAL = True #reuse the parsed tables and the SBML of entities whose rows have not changed since the last build
+CACHE_FOLDER = ".build_cache"
+DETERMINISTIC = True #derive metaids from the build fingerprint, so identical curation tables give identical files
+SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),"settings.json")
+REQUIRED_TABLES = ["Compartment","Compound","Reaction"] #the other tables are left out of the model when a folder does not have them
+SOURCES = module_paths("tsv_to_sbml","helper_classes","gpr","sbml_writer","build_cache","export","cobra_model","validation") #build code, part of the fingerprint
 
 
 __author__ = "Jake Hattwell"
@@ -41,9 +52,15 @@ __status__ = "Live"
 ######################
 ######################
 
-def genID():
-    ##UUID generator
-    return str(uuid.uuid4()).replace("-","_")
+def table_data(compiler,name):
+    """Function to get the entries of a table, or no entries if the folder does not have that table"""
+    return compiler.tables[name].data if name in compiler.tables else {}
+
+def genID(seed=None):
+    ##UUID generator, a seed gives the same ID every time
+    if seed is None:
+        return str(uuid.uuid4()).replace("-","_")
+    return str(uuid.uuid5(uuid.NAMESPACE_OID,seed)).replace("-","_")
 
 def annotate(db_dict, ref):
     """Function to access reference links, and handle when those links are not in DB table"""    
@@ -59,59 +76,109 @@ def check_db_type(db_dict,ref):
     else:
         return "Is"
 
-def gen_annotation_tree(parent, db_dict, data):
-    #get a list of which DBs are annotated for this entry, as well as what type of DB they are
-    annotated_dbs = [db.split(":")[1] for db in data.keys() if "!Identifiers" in db and data[db] != ""]
-    db_types = [check_db_type(db_dict,db) for db in annotated_dbs]
+def annotation_plan(db_dict, headers, plans=None):
+    """Function to work out which identifier columns are annotated, into which bag and with which prefix
+
+    Every row of a table has the same headers, so a build works this out once per table: plans is its
+    headers:plan memo, and must only be shared by calls with the same database table.
+    """
+    if plans is not None and headers in plans:
+        return plans[headers]
+    plan = []
+    for header in headers:
+        if "!Identifiers" in header:
+            db = header.split(":")[1]
+            plan.append((header,check_db_type(db_dict,db) == "Is",annotate(db_dict,db)+":"))
+    if plans is not None:
+        plans[headers] = plan
+    return plan
+
+def gen_annotation_tree(parent, db_dict, data, plans=None):
+    #get the non-empty identifier columns of this entry, as (is a bqbiol:is DB, identifiers.org prefix, cell)
+    #plans is the memo of annotation_plan for db_dict, shared by the calls of one build
+    annotated = [(is_db,prefix,data[header]) for header,is_db,prefix in annotation_plan(db_dict,tuple(data),plans) if data[header] != ""]
+    if not annotated:
+        return
     # create bqbiol:type -> rdf:bag -> rdf:li elements 
-    if "Is" in db_types:
-        bqbiol_is_and_rdf_bag = etree.SubElement(etree.SubElement(parent,"{%s}"%NS_MAP["bqbiol"]+"is"),"{%s}"%NS_MAP["rdf"]+"Bag")
-    if "In" in db_types:
-        bqbiol_occurs_in_and_rdf_bag = etree.SubElement(etree.SubElement(parent,"{%s}"%NS_MAP["bqbiol"]+"isPartOf"),"{%s}"%NS_MAP["rdf"]+"Bag")
+    bags = {}
+    if any(is_db for is_db,prefix,cell in annotated):
+        bags[True] = etree.SubElement(etree.SubElement(parent,BQBIOL_IS),RDF_BAG)
+    if not all(is_db for is_db,prefix,cell in annotated):
+        bags[False] = etree.SubElement(etree.SubElement(parent,BQBIOL_IS_PART_OF),RDF_BAG)
 
     #annotate to the correct bag
-    for db in annotated_dbs:
-        if check_db_type(db_dict,db) == "Is":
-            for identifier in data["!Identifiers:"+db].split("|"):
-                etree.SubElement(bqbiol_is_and_rdf_bag,"{%s}"%NS_MAP["rdf"]+"li",attrib={"{%s}"%NS_MAP["rdf"]+"resource":annotate(db_dict,db)+":"+identifier})
-        else:
-            for identifier in data["!Identifiers:"+db].split("|"): 
-                etree.SubElement(bqbiol_occurs_in_and_rdf_bag,"{%s}"%NS_MAP["rdf"]+"li",attrib={"{%s}"%NS_MAP["rdf"]+"resource":annotate(db_dict,db)+":"+identifier})
+    for is_db,prefix,cell in annotated:
+        bag = bags[is_db]
+        for identifier in cell.split("|"):
+            etree.SubElement(bag,RDF_LI,{RDF_RESOURCE:prefix+identifier})
 
 
+#define xml namespaces for inclusion
+NS_MAP = {
+    'fbc': "http://www.sbml.org/sbml/level3/version1/fbc/version2",
+    'groups':"http://www.sbml.org/sbml/level3/version1/groups/version1",
+    'xhtml':"http://www.w3.org/1999/xhtml",
+    'rdf':"http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+    'dc':"http://purl.org/dc/elements/1.1/",
+    'vCard':"http://www.w3.org/2001/vcard-rdf/3.0#",
+    'dcterms':"http://purl.org/dc/terms/",
+    'bqbiol':"http://biomodels.net/biology-qualifiers/",
+    None: "http://www.sbml.org/sbml/level3/version1/core"} #This is just a catcher/default namespace
 
-## Load settings
-print("Build model is set to",BUILD)
-settings = json.load(open("travis/settings.json","r"))["pipeline"]
+#qualified tag names used by every annotation, built once
+RDF_RDF = "{%s}"%NS_MAP["rdf"]+"RDF"
+RDF_DESCRIPTION = "{%s}"%NS_MAP["rdf"]+"Description"
+RDF_ABOUT = "{%s}"%NS_MAP["rdf"]+"about"
+RDF_BAG = "{%s}"%NS_MAP["rdf"]+"Bag"
+RDF_LI = "{%s}"%NS_MAP["rdf"]+"li"
+RDF_RESOURCE = "{%s}"%NS_MAP["rdf"]+"resource"
+BQBIOL_IS = "{%s}"%NS_MAP["bqbiol"]+"is"
+BQBIOL_IS_PART_OF = "{%s}"%NS_MAP["bqbiol"]+"isPartOf"
 
-    
+# GPR helper functions
 
-## Load tsv files
-compiler = ModelSystem()
-compiler.load_folder("curation")
+def genHead(parent,booltype):
+    #function to generate the and/or xml field
+    if booltype == "or":
+        branch = etree.SubElement(parent,"{%s}"%NS_MAP["fbc"]+"or",attrib={"sboTerm":"SBO:0000174"})
+    else:
+        branch = etree.SubElement(parent,"{%s}"%NS_MAP["fbc"]+"and",attrib={"sboTerm":"SBO:0000173"})
+    return branch
 
-metabolite_validation = compiler.validate_rxn_mets() #check that all required metabolites are included in the model
+def gen_gpr_tree(parent,node):
+    #function to recursively generate the xml tree of a parsed gene association
+    if node[0] == "gene":
+        etree.SubElement(parent,"{%s}"%NS_MAP["fbc"]+"geneProductRef",attrib={"{%s}"%NS_MAP["fbc"]+"geneProduct":"G_"+node[1]})
+    else:
+        branch = genHead(parent,node[0])
+        for child in node[1]:
+            gen_gpr_tree(branch,child)
 
-if settings["dbtable"]:
-    db_dict = compiler.tables.get("Database").data
-else:
-    db_dict = {}
+def parse(parent,rule):
+    node = parse_gpr(rule)
+    if node is None: #handle empty gene associations
+        return None
+    gpr = etree.SubElement(parent,"{%s}"%NS_MAP["fbc"]+"geneProductAssociation")
+    gen_gpr_tree(gpr,node)
+    return gpr
 
-try:
-    assert len(metabolite_validation) == 0, "Missing metabolites"
-except:
-    text = "Reaction: Missing Metabolites"
-    for key,val in metabolite_validation.items():
-        text += "\n"+key+": " + ", ".join(val)
+
+
+
+def report_failure(endpoint,build_number,description,text):
+    """Function to print why a build was aborted, and post it to Discord if an endpoint is given"""
+    print(text)
+    if endpoint is None:
+        return
     payload_json = {
         "embeds": [{
             "title": "WormJam CI Report",
             "color": 10027008,
-            "description": "Missing Metabolites - Build aborted",
+            "description": description+" - Build aborted",
             "fields":[
                 {
                     "name": "Build Number",
-                    "value":str(TRAVIS_BUILD_NUMBER)
+                    "value":str(build_number)
                 },
                 {
                     "name":"Notes",
@@ -124,21 +191,22 @@ except:
             "timestamp": str(datetime.datetime.now().isoformat())
         }]
     }
-    r =requests.post(DISCORD_ENDPOINT,data=json.dumps(payload_json), headers={"Content-Type": "application/json"})
-    exit(1)
-
-#only include genes that are involved in regulation of reactions in the SBML model
-active_gene_list = []
-for key,val in compiler.tables.get("Reaction").data.items():
-    genes = val["!GeneAssociation"].split(" ")
-    genes = [i.replace("(","").replace(")","") for i in genes]
-    while "and" in genes:
-        genes.remove("and")
-    while "or" in genes:
-        genes.remove("or")
-    active_gene_list.extend(genes)
-active_gene_list = set(active_gene_list)
-print(len(active_gene_list))
+    r =requests.post(endpoint,data=json.dumps(payload_json), headers={"Content-Type": "application/json"})
+
+def report_missing_metabolites(endpoint,build_number,missing):
+    """Function to print the reactions with metabolites missing from the Compound table, and post them to Discord if an endpoint is given"""
+    text = "Reaction: Missing Metabolites"
+    for key,val in missing.items():
+        text += "\n"+key+": " + ", ".join(val)
+    report_failure(endpoint,build_number,"Missing Metabolites",text)
+
+def report_invalid_tables(endpoint,build_number,findings):
+    """Function to print the validation errors of the tables, and post them to Discord if an endpoint is given"""
+    text = "Table ID: Error"
+    for item in findings:
+        text += "\n"+item["table"]+" "+item["id"]+": "+item["message"]
+    report_failure(endpoint,build_number,"Invalid Tables",text)
+
 
 ######################
 ######################
@@ -147,330 +215,467 @@ print(len(active_gene_list))
 ##
 ######################
 ######################
-if BUILD:
-    output_model = open(OUTPUT_NAME,"wb")
-
-#define xml namespaces for inclusion
-NS_MAP = {
-    'fbc': "http://www.sbml.org/sbml/level3/version1/fbc/version2",
-    'groups':"http://www.sbml.org/sbml/level3/version1/groups/version1",
-    'xhtml':"http://www.w3.org/1999/xhtml",
-    'rdf':"http://www.w3.org/1999/02/22-rdf-syntax-ns#",
-    'dc':"http://purl.org/dc/elements/1.1/",
-    'vCard':"http://www.w3.org/2001/vcard-rdf/3.0#",
-    'dcterms':"http://purl.org/dc/terms/",
-    'bqbiol':"http://biomodels.net/biology-qualifiers/",
-    None: "http://www.sbml.org/sbml/level3/version1/core"} #This is just a catcher/default namespace
-
-#create sbml structure
-sbml = etree.Element("sbml",metaid=genID(),attrib={"{%s}"%NS_MAP["fbc"]+"required":"false","{%s}"%NS_MAP["groups"]+"required":"false"},nsmap=NS_MAP)
-other_attribs = {
-    "level":"3",
-    "version":"1",
-}
-for key,val in other_attribs.items():
-    sbml.set(key,val)
-
-#create model structure
-#customisation goes here
-#id = 
-#name = 
-#desc = 
-model = etree.SubElement(sbml,"model",id="WormJamTestBuild",attrib={"{%s}"%NS_MAP["fbc"]+"strict":"false"},metaid=genID(),name="WormJam Draft Model")
-model_notes = etree.SubElement(model,"notes")
-model_notes_desc = etree.SubElement(model_notes,"{%s}"%NS_MAP["xhtml"]+"p")
-model_notes_desc.text="Genome Scale Model of the organism Caenorhabditis elegans"
-
-#
-# curators
-# We store the curator information within the model's annotation
-# Need to add in that curators do get mentioned in the annotation package
-#
-
-model_annotation = etree.SubElement(model,"annotation")
-model_annotation_RDF = etree.SubElement(model_annotation,"{%s}"%NS_MAP["rdf"]+"RDF")
-# In this script, I nest much of the XML structure creation
-# rdf:Description -> dc:creator -> rdf:Bag == This bag holds lists. Each list contains info about a curator.
-model_annotation_RDF_description_DC_bag = etree.SubElement(etree.SubElement(etree.SubElement(model_annotation_RDF,"{%s}"%NS_MAP["rdf"]+"Description",attrib={"{%s}"%NS_MAP["rdf"]+"about":"#"+model.get("metaid")}),"{%s}"%NS_MAP["dc"]+"creator"),"{%s}"%NS_MAP["rdf"]+"Bag")
-
-for key,val in compiler.tables.get("Curator").data.items():
-    rdf_li = etree.SubElement(model_annotation_RDF_description_DC_bag,"{%s}"%NS_MAP["rdf"]+"li",attrib={"{%s}"%NS_MAP["rdf"]+"about":key,"{%s}"%NS_MAP["rdf"]+"parseType":"Resource"})
-    vCard_N = etree.SubElement(rdf_li,"{%s}"%NS_MAP["vCard"]+"N",attrib={"{%s}"%NS_MAP["rdf"]+"parseType":"Resource"})
-    etree.SubElement(vCard_N,"{%s}"%NS_MAP["vCard"]+"Family").text = val["!family-name"]
-    etree.SubElement(vCard_N,"{%s}"%NS_MAP["vCard"]+"Given").text = val["!given-name"]
-    etree.SubElement(rdf_li,"{%s}"%NS_MAP["vCard"]+"EMAIL").text = val["!email"]
-    vCard_ORG = etree.SubElement(rdf_li,"{%s}"%NS_MAP["vCard"]+"ORG",attrib={"{%s}"%NS_MAP["rdf"]+"parseType":"Resource"})
-    etree.SubElement(vCard_ORG,"{%s}"%NS_MAP["vCard"]+"Orgname").text = val["!organization-name"]
-
-
-
-#
-# genes
-# 
-#
-
-model_listOfGeneProducts = etree.SubElement(model,"{%s}"%NS_MAP["fbc"]+"listOfGeneProducts")
-
-for key,val in compiler.tables.get("Gene").data.items():
-    if key in active_gene_list: #filter for only used genes
-        attribs = {
-            "{%s}"%NS_MAP["fbc"]+"id":"G_"+key,
-            "{%s}"%NS_MAP["fbc"]+"label":key,
-            "{%s}"%NS_MAP["fbc"]+"name":val["!Locus"],
-            "metaid":key.replace(" ","_")
-        }
-        fbc_gene_prod = etree.SubElement(model_listOfGeneProducts,"{%s}"%NS_MAP["fbc"]+"geneProduct",attrib=attribs)
-        annotation = etree.SubElement(fbc_gene_prod,"annotation")
-        rdf_RDF = etree.SubElement(annotation,"{%s}"%NS_MAP["rdf"]+"RDF")
-        rdf_desc = etree.SubElement(rdf_RDF,"{%s}"%NS_MAP["rdf"]+"Description",attrib={"{%s}"%NS_MAP["rdf"]+"about":"#"+attribs["metaid"]})
-        gen_annotation_tree(rdf_desc,db_dict,val)      
-
-#
-# Pathways
-#
-model_listOfGroups = etree.SubElement(model,"{%s}"%NS_MAP["groups"]+"listOfGroups")
-
-for key,val in compiler.tables.get("Pathway").data.items():
-    attribs = {
-        "{%s}"%NS_MAP["groups"]+"id":"P_"+key.replace(" ","_"),
-        "{%s}"%NS_MAP["groups"]+"kind":"partonomy",
-        "{%s}"%NS_MAP["groups"]+"name":key,
-        "metaid":key.replace(" ","_")
-    }
-    groups_group = etree.SubElement(model_listOfGroups,"{%s}"%NS_MAP["groups"]+"group",attrib=attribs)
-    g_annotation = etree.SubElement(groups_group,"annotation")
-    g_rdf_desc = etree.SubElement(etree.SubElement(g_annotation,"{%s}"%NS_MAP["rdf"]+"RDF"),"{%s}"%NS_MAP["rdf"]+"Description",attrib={"{%s}"%NS_MAP["rdf"]+"about":"#"+attribs["metaid"]})
-    #annotate
-    gen_annotation_tree(g_rdf_desc,db_dict,val)
-    #insert group members
-    g_listOfMembers = etree.SubElement(groups_group,"{%s}"%NS_MAP["groups"]+"listOfMembers")
-    listOfMembers = [rxn for rxn,info in compiler.tables.get("Reaction").data.items() if info["!Pathway"] == key]
-    for i in listOfMembers:
-        etree.SubElement(g_listOfMembers,"{%s}"%NS_MAP["groups"]+"member",attrib={"{%s}"%NS_MAP["groups"]+"id":"GM_"+i,"{%s}"%NS_MAP["groups"]+"idRef":i})
-
-
-#
-# Compartments
-#
-model_compartment_tree = etree.SubElement(model,"listOfCompartments")
-
-for key,val in compiler.tables.get("Compartment").data.items():
-    metaid = key.replace(" ","_")
-    #fairly straightforward annotation
-    compartment = etree.SubElement(model_compartment_tree,"compartment",attrib={"constant":"true","id":key,"metaid":metaid,"name":val["!Name"],"size":"1","spatialDimensions":str(val["!spatialDimensions"])})
-
-    annotation = etree.SubElement(compartment,"annotation")
-    cmpt_rdf_desc = etree.SubElement(etree.SubElement(annotation,"{%s}"%NS_MAP["rdf"]+"RDF"),"{%s}"%NS_MAP["rdf"]+"Description",attrib={"{%s}"%NS_MAP["rdf"]+"about":"#"+metaid})
-    # annotate
-    gen_annotation_tree(cmpt_rdf_desc,db_dict,val)
-
-#
-# Species
-#
-
-model_species_tree = etree.SubElement(model,"listOfSpecies")
-
-for key,val in compiler.tables.get("Compound").data.items():
-    attribs = {
-        "boundaryCondition":"false",
-        "compartment":val["!Location"],
-        "constant":"false",
-        "{%s}"%NS_MAP["fbc"]+"charge":val["!Charge"],
-        "{%s}"%NS_MAP["fbc"]+"chemicalFormula":val["!Formula"],
-        "hasOnlySubstanceUnits":"false",
-        "id":key,
-        "initialConcentration":val.get("!initialConcentration","0"),
-        "name":"!Name"
-    }
-    if attribs["{%s}"%NS_MAP["fbc"]+"charge"] == "":
-        attribs["{%s}"%NS_MAP["fbc"]+"charge"] = "0"
-    metaid = key.replace(" ","_")
-    metabolite = etree.SubElement(model_species_tree,"species",metaid=metaid,attrib=attribs)
-    notes_body = etree.SubElement(etree.SubElement(metabolite,"notes"),"{%s}"%NS_MAP["xhtml"]+"body")
-    for i in [key2 for key2 in list(val.keys()) if all(block not in key2 for block in ["!Identifiers","!Formula","!Charge"])]:
-        if val[i]!="":
-            if key=="!Charge" and val[i]=="":
-                val[i] == "0" #small fix to change a blank charge to a charge of 0
-            etree.SubElement(notes_body,"{%s}"%NS_MAP["xhtml"]+"p").text=i.replace("!","").replace("Notes:","").upper() + ": " + val[i]
-    annotation_tree = etree.SubElement(etree.SubElement(etree.SubElement(metabolite,"annotation"),"{%s}"%NS_MAP["rdf"]+"RDF"),"{%s}"%NS_MAP["rdf"]+"Description",attrib={"{%s}"%NS_MAP["rdf"]+"about":"#"+metaid})
-    gen_annotation_tree(annotation_tree,db_dict,val)
-
-#
-# Parameters
-#
-
-parameter_tree = etree.SubElement(model,"listOfParameters")
-etree.SubElement(parameter_tree,"parameter",attrib={"constant":"true","id":"LOWER_BOUND","value":"-1000"})
-etree.SubElement(parameter_tree,"parameter",attrib={"constant":"true","id":"ZERO_BOUND","value":"0"})
-etree.SubElement(parameter_tree,"parameter",attrib={"constant":"true","id":"UPPER_BOUND","value":"1000"})
-
-#
-# Reactions
-#
-
-
-# GPR helper functions
-
-def genHead(parent,booltype):
-    #function to generate the and/or xml field
-    if booltype == "or":
-        branch = etree.SubElement(parent,"{%s}"%NS_MAP["fbc"]+"or",attrib={"sboTerm":"SBO:0000174"})
-    else:
-        branch = etree.SubElement(parent,"{%s}"%NS_MAP["fbc"]+"and",attrib={"sboTerm":"SBO:0000173"})
-    return branch
 
-def parse(parent,my_list):
-    if my_list == []: #handle empty gene associations
-        result =  None
-        return None
-    while type(my_list) == list and len(my_list) == 1: #whilst there is a single entry in the list, unpack it
-        my_list = my_list[0]
-    if type(my_list) == str: #Handling single genes
-        result = ("single",my_list)
+def build_model(folder="curation",output=OUTPUT_NAME,cache_folder=CACHE_FOLDER,profiler=None,formats=("sbml",)):
+    """Function to build the SBML model of a folder of SBtab tables
+
+        Keyword Arguments:
+            folder {str} -- SBtab folder to build (default: {"curation"})
+            output {str} -- SBML file to write, the build fingerprint is written next to it (default: {OUTPUT_NAME})
+            cache_folder {str} -- folder of the table snapshot and SBML fragments of the incremental build,
+                every folder that is built needs its own (default: {CACHE_FOLDER})
+            profiler {StageProfiler} -- profiler the stages of the build are marked on, the caller stops it (default: {None})
+            formats {list} -- formats the model is exported to in the same pass, from export.FORMATS, named after
+                the output (default: {("sbml",)})
+
+        Returns:
+            dict -- folder, output, fingerprint and status of the build, which is one of "built", "up to date",
+                "missing tables", "missing metabolites" (listed in missing, by reaction) or "invalid tables" (the
+                other error findings of validation.Validator, listed in errors), and the exports as format:path
+    """
+    result = {"folder":folder,"output":output,"fingerprint":None,"status":None,"missing":{},"errors":[],"exports":{}}
+    fingerprint_name = output+".fingerprint"
+    exports = export.export_paths(output,formats)
+    if profiler is None:
+        profiler = StageProfiler()
+
+    ## Load settings
+    print("Build model is set to",BUILD)
+    settings = json.load(open(SETTINGS_FILE,"r"))["pipeline"]
+
+    ## Load tsv files
+    profiler.stage("load tables")
+    compiler = ModelSystem(columnar=True)
+    compiler.load_folder(folder,snapshot=os.path.join(cache_folder,"tables.pickle") if INCREMENTAL else None,exclude=["Gene"]) #only the genes in use are loaded, see below
+    absent = [name for name in REQUIRED_TABLES if name not in compiler.tables]
+    if absent:
+        print("Tables missing from",folder+":",", ".join(absent))
+        result["status"] = "missing tables"
+        result["missing"] = {folder:absent}
+        return result
+
+    profiler.stage("index")
+    compiler.index #built on first use, timed on its own rather than as part of the validation
+    profiler.stage("validate")
+    findings = validation.Validator(compiler).run(validation.rules_of(validation.ERROR)) #only errors stop the build, warnings are left to validation.py
+    metabolite_validation = {item["id"]:item["values"] for item in findings if item["rule"] == "missing_metabolite"} #check that all required metabolites are included in the model
+
+    if settings["dbtable"] and "Database" in compiler.tables:
+        db_dict = compiler.tables.get("Database").data
     else:
-        if any(type(i) == list for i in my_list): #If there are lists (nested Gene associations)
-            for index,item in enumerate(my_list):
-                #unpack
-                if type(item) == list and len(item) == 1:
-                    my_list[index] = item[0]
-            types = None
-            op_type = my_list[1]
-            types = op_type
-            while op_type in my_list:
-                my_list.remove(op_type)
-            for index,item in enumerate(my_list): #start diving down levels
-                if type(item)==list:
-                    op_type=item[1]
-                    while op_type in item:
-                        item.remove(op_type)
-                    for index2,item2 in enumerate(item):
-                        if type(item2)==list:
-                            op_type2=item2[1]
-                            while op_type2 in item2:
-                                item2.remove(op_type2)
-                            item[index2]=(op_type2,item2)
-                    my_list[index] = (op_type,item)
-            result = (types,my_list)
-        else:
-            op_type = my_list[1]
-            while op_type in my_list:
-                my_list.remove(op_type)
-            result = (op_type,my_list)
-    #create the xml tree
-    gpr = etree.SubElement(parent,"{%s}"%NS_MAP["fbc"]+"geneProductAssociation")
-    #simple case
-    if result[0] == 'single':
-        etree.SubElement(gpr,"{%s}"%NS_MAP["fbc"]+"geneProductRef",attrib={"{%s}"%NS_MAP["fbc"]+"geneProduct":"G_"+result[1]})
-    #No nesting bool
-    elif all(type(i) != tuple for i in result[1]):
-        branch = genHead(gpr,result[0])
-        for i in result[1]:
-            etree.SubElement(branch,"{%s}"%NS_MAP["fbc"]+"geneProductRef",attrib={"{%s}"%NS_MAP["fbc"]+"geneProduct":"G_"+i})
-    #complex case
+        db_dict = {}
+    plans = {} #annotation plan of every table, see annotation_plan
+
+    if len(metabolite_validation) != 0:
+        result["status"] = "missing metabolites"
+        result["missing"] = metabolite_validation
+        return result
+    if len(findings) != 0:
+        result["status"] = "invalid tables"
+        result["errors"] = findings
+        return result
+
+    #only include genes that are involved in regulation of reactions in the SBML model
+    profiler.stage("load genes")
+    active_gene_list = compiler.index.active_genes()
+    print(len(active_gene_list))
+    gene_file = os.path.join(folder,"Gene-SBtab.tsv")
+    if os.path.isfile(gene_file): #read only the rows of those genes, and the columns that go into the SBML
+        compiler.load_table("Gene",gene_file,columns=[header for header in read_headers(gene_file) if header == "!Locus" or "!Identifiers" in header],where=active_gene_list.__contains__)
+
+    profiler.stage("fingerprint")
+    # The fingerprint identifies everything the model is built from, downstream stages can reuse results keyed on it
+    fingerprint = digest(compiler.fingerprint(),*[open(path,"rb").read() for path in SOURCES],settings)
+    result["fingerprint"] = fingerprint
+    print("Build fingerprint:",fingerprint)
+    if BUILD and DETERMINISTIC and all(os.path.isfile(path) for path in exports.values()) and os.path.isfile(fingerprint_name):
+        with open(fingerprint_name) as f:
+            if f.read().strip() == fingerprint:
+                print(output,"is up to date, nothing to build")
+                result["status"] = "up to date"
+                result["exports"] = exports
+                return result
+
+    # The model is streamed to disk one entity at a time rather than built as a single tree, and to every SBML format at once
+    if BUILD:
+        if os.path.isfile(fingerprint_name): #only written back once the new model is complete
+            os.remove(fingerprint_name)
+        export.remove_exports(export.export_paths(output,export.FORMATS)) #formats not exported this time would be left from an older model
+        output_model = export.SBMLOutputs(exports,DETERMINISTIC)
     else:
-        branch = genHead(gpr,result[0])
-        for i in result[1]: #level diving
-            if type(i) == tuple:
-                inner = genHead(branch,i[0])
-                for j in i[1]:
-                    if type(j) == tuple:
-                        inner2 = genHead(branch,j[0])
-                        for k in j[1]:
-                            etree.SubElement(inner2,"{%s}"%NS_MAP["fbc"]+"geneProductRef",attrib={"{%s}"%NS_MAP["fbc"]+"geneProduct":"G_"+k})
-                    else:
-                        etree.SubElement(inner,"{%s}"%NS_MAP["fbc"]+"geneProductRef",attrib={"{%s}"%NS_MAP["fbc"]+"geneProduct":"G_"+j})
-
-            else:
-                etree.SubElement(branch,"{%s}"%NS_MAP["fbc"]+"geneProductRef",attrib={"{%s}"%NS_MAP["fbc"]+"geneProduct":"G_"+i[1]})
-    return gpr
-
-    ##reaction string handling
-def react_proc(rxn):
-    r,p = rxn.split("<=>")
-    def quick(frag):
-        frag = frag.split("+")
-        frag = [i.rstrip().lstrip() for i in frag]
-        frag = [i.split(" ") for i in frag]
-        return frag
-    r = quick(r)
-    p = quick(p)
-    #packaging
-    reactants = {(i[1] if len(i) == 2 else i[0]):(i[0] if len(i)==2 else "1") for i in r}
-    products = {(i[1] if len(i) == 2 else i[0]):(i[0] if len(i)==2 else "1") for i in p}
-    for d in [reactants,products]:
-        for key,val in d.items():
-            try:
-                d[key] = str(float(val))
-            except:
-                pass
+        output_model = open(os.devnull,"wb")
 
-    return (reactants,products)   
+    profiler.stage("model header")
+    writer = SBMLStreamWriter(output_model,NS_MAP)
+    writer.write_declaration()
 
+    # Fragments are invalidated by their own rows, and as a whole by any change to the build scripts or databases
+    cache = FragmentCache(cache_folder if INCREMENTAL else None,sources=SOURCES,context=[db_dict,NS_MAP])
 
-
-
-#### Actually doing the reactions
- 
-reaction_tree = etree.SubElement(model,"listOfReactions")
-
-
-ignore = ["!Identifiers:kegg.reaction","!Identifiers:rheadb_exact","!Identifiers:rheadb_fuzzy","!Identifiers:pubmed","!Identifiers:doi","!Identifiers:eco",
-"!Authors","!ReactionFormula","!SuperPathway","!Name","!IsReversible"]
-
-for key,val in compiler.tables.get("Reaction").data.items():
-    metaid = key.replace(" ","_")
-    attribs = {
-        "fast":"false",
-        "reversible":val["!IsReversible"].lower(),
-        "metaid":metaid,
-        "id":key,
-        "name":val["!Name"],
-        "{%s}"%NS_MAP["fbc"]+"upperFluxBound":"UPPER_BOUND"
+    #create sbml structure
+    sbml = writer.Element("sbml",metaid=genID(fingerprint+":sbml" if DETERMINISTIC else None),attrib={"{%s}"%NS_MAP["fbc"]+"required":"false","{%s}"%NS_MAP["groups"]+"required":"false"})
+    other_attribs = {
+        "level":"3",
+        "version":"1",
     }
-    if attribs["reversible"] == "true":
-        attribs["{%s}"%NS_MAP["fbc"]+"lowerFluxBound"] = "LOWER_BOUND"
+    for key,val in other_attribs.items():
+        sbml.set(key,val)
+    writer.start(sbml)
+
+    #create model structure
+    #customisation goes here
+    #id = 
+    #name = 
+    #desc = 
+    model = writer.Element("model",id="WormJamTestBuild",attrib={"{%s}"%NS_MAP["fbc"]+"strict":"false"},metaid=genID(fingerprint+":model" if DETERMINISTIC else None),name="WormJam Draft Model")
+    writer.start(model)
+    model_notes = writer.Element("notes")
+    model_notes_desc = etree.SubElement(model_notes,"{%s}"%NS_MAP["xhtml"]+"p")
+    model_notes_desc.text="Genome Scale Model of the organism Caenorhabditis elegans"
+    writer.write(model_notes)
+
+    #
+    # curators
+    # We store the curator information within the model's annotation
+    # Need to add in that curators do get mentioned in the annotation package
+    #
+
+    model_annotation = writer.Element("annotation")
+    model_annotation_RDF = etree.SubElement(model_annotation,"{%s}"%NS_MAP["rdf"]+"RDF")
+    # In this script, I nest much of the XML structure creation
+    # rdf:Description -> dc:creator -> rdf:Bag == This bag holds lists. Each list contains info about a curator.
+    model_annotation_RDF_description_DC_bag = etree.SubElement(etree.SubElement(etree.SubElement(model_annotation_RDF,"{%s}"%NS_MAP["rdf"]+"Description",attrib={"{%s}"%NS_MAP["rdf"]+"about":"#"+model.get("metaid")}),"{%s}"%NS_MAP["dc"]+"creator"),"{%s}"%NS_MAP["rdf"]+"Bag")
+
+    for key,val in table_data(compiler,"Curator").items():
+        rdf_li = etree.SubElement(model_annotation_RDF_description_DC_bag,"{%s}"%NS_MAP["rdf"]+"li",attrib={"{%s}"%NS_MAP["rdf"]+"about":key,"{%s}"%NS_MAP["rdf"]+"parseType":"Resource"})
+        vCard_N = etree.SubElement(rdf_li,"{%s}"%NS_MAP["vCard"]+"N",attrib={"{%s}"%NS_MAP["rdf"]+"parseType":"Resource"})
+        etree.SubElement(vCard_N,"{%s}"%NS_MAP["vCard"]+"Family").text = val.get("!family-name","")
+        etree.SubElement(vCard_N,"{%s}"%NS_MAP["vCard"]+"Given").text = val.get("!given-name","")
+        etree.SubElement(rdf_li,"{%s}"%NS_MAP["vCard"]+"EMAIL").text = val.get("!email","")
+        vCard_ORG = etree.SubElement(rdf_li,"{%s}"%NS_MAP["vCard"]+"ORG",attrib={"{%s}"%NS_MAP["rdf"]+"parseType":"Resource"})
+        etree.SubElement(vCard_ORG,"{%s}"%NS_MAP["vCard"]+"Orgname").text = val.get("!organization-name","")
+    writer.write(model_annotation)
+
+
+
+    #
+    # genes
+    profiler.stage("genes")
+    # 
+    #
+
+    model_listOfGeneProducts = writer.Element("{%s}"%NS_MAP["fbc"]+"listOfGeneProducts")
+    writer.start(model_listOfGeneProducts)
+
+    gene_table = table_data(compiler,"Gene")
+    for key in gene_table:
+        if key in active_gene_list: #filter for only used genes
+            val = gene_table[key]
+            if cache.reuse(writer,"Gene",key,val):
+                continue
+            attribs = {
+                "{%s}"%NS_MAP["fbc"]+"id":"G_"+key,
+                "{%s}"%NS_MAP["fbc"]+"label":key,
+                "{%s}"%NS_MAP["fbc"]+"name":val["!Locus"],
+                "metaid":key.replace(" ","_")
+            }
+            fbc_gene_prod = writer.Element("{%s}"%NS_MAP["fbc"]+"geneProduct",attrib=attribs)
+            annotation = etree.SubElement(fbc_gene_prod,"annotation")
+            rdf_RDF = etree.SubElement(annotation,RDF_RDF)
+            rdf_desc = etree.SubElement(rdf_RDF,RDF_DESCRIPTION,attrib={RDF_ABOUT:"#"+attribs["metaid"]})
+            gen_annotation_tree(rdf_desc,db_dict,val,plans)
+            cache.write(writer,"Gene",key,fbc_gene_prod)
+    writer.end()
+
+    #
+    # Pathways
+    profiler.stage("pathways")
+    #
+    model_listOfGroups = writer.Element("{%s}"%NS_MAP["groups"]+"listOfGroups")
+    writer.start(model_listOfGroups)
+
+    for key,val in table_data(compiler,"Pathway").items():
+        listOfMembers = compiler.index.reactions_in_pathway(key)
+        if cache.reuse(writer,"Pathway",key,val,listOfMembers):
+            continue
+        attribs = {
+            "{%s}"%NS_MAP["groups"]+"id":"P_"+key.replace(" ","_"),
+            "{%s}"%NS_MAP["groups"]+"kind":"partonomy",
+            "{%s}"%NS_MAP["groups"]+"name":key,
+            "metaid":key.replace(" ","_")
+        }
+        groups_group = writer.Element("{%s}"%NS_MAP["groups"]+"group",attrib=attribs)
+        g_annotation = etree.SubElement(groups_group,"annotation")
+        g_rdf_desc = etree.SubElement(etree.SubElement(g_annotation,RDF_RDF),RDF_DESCRIPTION,attrib={RDF_ABOUT:"#"+attribs["metaid"]})
+        #annotate
+        gen_annotation_tree(g_rdf_desc,db_dict,val,plans)
+        #insert group members
+        g_listOfMembers = etree.SubElement(groups_group,"{%s}"%NS_MAP["groups"]+"listOfMembers")
+        for i in listOfMembers:
+            etree.SubElement(g_listOfMembers,"{%s}"%NS_MAP["groups"]+"member",attrib={"{%s}"%NS_MAP["groups"]+"id":"GM_"+i,"{%s}"%NS_MAP["groups"]+"idRef":i})
+        cache.write(writer,"Pathway",key,groups_group)
+    writer.end()
+
+
+    #
+    # Compartments
+    profiler.stage("compartments")
+    #
+    model_compartment_tree = writer.Element("listOfCompartments")
+    writer.start(model_compartment_tree)
+
+    for key,val in compiler.tables.get("Compartment").data.items():
+        if cache.reuse(writer,"Compartment",key,val):
+            continue
+        metaid = key.replace(" ","_")
+        #fairly straightforward annotation
+        compartment = writer.Element("compartment",attrib={"constant":"true","id":key,"metaid":metaid,"name":val["!Name"],"size":"1","spatialDimensions":str(val.get("!spatialDimensions","3"))})
+
+        annotation = etree.SubElement(compartment,"annotation")
+        cmpt_rdf_desc = etree.SubElement(etree.SubElement(annotation,RDF_RDF),RDF_DESCRIPTION,attrib={RDF_ABOUT:"#"+metaid})
+        # annotate
+        gen_annotation_tree(cmpt_rdf_desc,db_dict,val,plans)
+        cache.write(writer,"Compartment",key,compartment)
+    writer.end()
+
+    #
+    # Species
+    profiler.stage("species")
+    #
+
+    model_species_tree = writer.Element("listOfSpecies")
+    writer.start(model_species_tree)
+
+    for key,val in compiler.tables.get("Compound").data.items():
+        if cache.reuse(writer,"Compound",key,val):
+            continue
+        attribs = {
+            "boundaryCondition":"false",
+            "compartment":val["!Location"],
+            "constant":"false",
+            "{%s}"%NS_MAP["fbc"]+"charge":val["!Charge"],
+            "{%s}"%NS_MAP["fbc"]+"chemicalFormula":val.get("!Formula",""),
+            "hasOnlySubstanceUnits":"false",
+            "id":key,
+            "initialConcentration":val.get("!initialConcentration","0"),
+            "name":"!Name"
+        }
+        if attribs["{%s}"%NS_MAP["fbc"]+"charge"] == "":
+            attribs["{%s}"%NS_MAP["fbc"]+"charge"] = "0"
+        metaid = key.replace(" ","_")
+        metabolite = writer.Element("species",metaid=metaid,attrib=attribs)
+        notes_body = etree.SubElement(etree.SubElement(metabolite,"notes"),"{%s}"%NS_MAP["xhtml"]+"body")
+        for i in [key2 for key2 in list(val.keys()) if all(block not in key2 for block in ["!Identifiers","!Formula","!Charge"])]:
+            if val[i]!="":
+                if key=="!Charge" and val[i]=="":
+                    val[i] == "0" #small fix to change a blank charge to a charge of 0
+                etree.SubElement(notes_body,"{%s}"%NS_MAP["xhtml"]+"p").text=i.replace("!","").replace("Notes:","").upper() + ": " + val[i]
+        annotation_tree = etree.SubElement(etree.SubElement(etree.SubElement(metabolite,"annotation"),RDF_RDF),RDF_DESCRIPTION,attrib={RDF_ABOUT:"#"+metaid})
+        gen_annotation_tree(annotation_tree,db_dict,val,plans)
+        cache.write(writer,"Compound",key,metabolite)
+    writer.end()
+
+    #
+    # Parameters
+    profiler.stage("reactions")
+    #
+
+    parameter_tree = writer.Element("listOfParameters")
+    etree.SubElement(parameter_tree,"parameter",attrib={"constant":"true","id":"LOWER_BOUND","value":"-1000"})
+    etree.SubElement(parameter_tree,"parameter",attrib={"constant":"true","id":"ZERO_BOUND","value":"0"})
+    etree.SubElement(parameter_tree,"parameter",attrib={"constant":"true","id":"UPPER_BOUND","value":"1000"})
+    writer.write(parameter_tree)
+
+    #
+    # Reactions
+    #
+
+
+    #### Actually doing the reactions
+
+    reaction_tree = writer.Element("listOfReactions")
+    writer.start(reaction_tree)
+
+
+    ignore = ["!Identifiers:kegg.reaction","!Identifiers:rheadb_exact","!Identifiers:rheadb_fuzzy","!Identifiers:pubmed","!Identifiers:doi","!Identifiers:eco",
+    "!Authors","!ReactionFormula","!SuperPathway","!Name","!IsReversible"]
+
+    for key,val in compiler.tables.get("Reaction").data.items():
+        if cache.reuse(writer,"Reaction",key,val):
+            continue
+        metaid = key.replace(" ","_")
+        attribs = {
+            "fast":"false",
+            "reversible":val["!IsReversible"].lower(),
+            "metaid":metaid,
+            "id":key,
+            "name":val["!Name"],
+            "{%s}"%NS_MAP["fbc"]+"upperFluxBound":"UPPER_BOUND"
+        }
+        if attribs["reversible"] == "true":
+            attribs["{%s}"%NS_MAP["fbc"]+"lowerFluxBound"] = "LOWER_BOUND"
+        else:
+            attribs["{%s}"%NS_MAP["fbc"]+"lowerFluxBound"] = "ZERO_BOUND"
+        reaction_field = writer.Element("reaction",attrib=attribs)
+        notes_body = etree.SubElement(etree.SubElement(reaction_field,"notes"),"{%s}"%NS_MAP["xhtml"]+"body")
+        for i in [key2 for key2 in list(val.keys()) if all(block not in key2 for block in ["!Identifiers","!ReactionFormula"])]:
+            if val[i]!="":
+                etree.SubElement(notes_body,"{%s}"%NS_MAP["xhtml"]+"p").text=i.replace("!","").replace("Notes:","").replace("Pathway","Subsystem").upper() + ": " + val[i]
+
+
+        annotation_tree = etree.SubElement(etree.SubElement(etree.SubElement(reaction_field,"annotation"),RDF_RDF),RDF_DESCRIPTION,attrib={RDF_ABOUT:"#"+metaid})
+        gen_annotation_tree(annotation_tree, db_dict, val, plans)
+
+
+        try:
+            parse(reaction_field,val["!GeneAssociation"])
+        except ValueError as e:
+            print(key,val["!GeneAssociation"])
+            print(e)
+
+        reactants,products = compiler.index.reaction_formulas[key]
+        if "" not in reactants:
+            listOfReactants = etree.SubElement(reaction_field,"listOfReactants")
+            for key2,val2 in reactants.items():
+                etree.SubElement(listOfReactants,"speciesReference",attrib={"constant":"true","species":key2,"stoichiometry":val2})
+        if "" not in products:       
+            listOfProducts = etree.SubElement(reaction_field,"listOfProducts")
+            for key2,val2 in products.items():
+                etree.SubElement(listOfProducts,"speciesReference",attrib={"constant":"true","species":key2,"stoichiometry":val2})
+        cache.write(writer,"Reaction",key,reaction_field)
+    writer.end()
+
+
+
+    ######################
+    ######################
+    ## 
+    ## Output
+    profiler.stage("finish")
+    ##
+    ######################
+    ######################
+    writer.end() #model
+    writer.end() #sbml
+    output_model.close()
+    if BUILD:
+        profiler.stage("export")
+        export.write_cobra(compiler,exports)
+        result["exports"] = exports
+        with open(fingerprint_name,"w") as f:
+            f.write(fingerprint+"\n")
+
+    if INCREMENTAL:
+        cache.save()
+        print("Incremental build:",cache.hits,"entities reused,",cache.misses,"rebuilt")
+    result["status"] = "built"
+    return result
+
+def version_name(folder):
+    """Function to name a build after its folder, model_versions/<version>/SBtab/tsv is named <version>"""
+    parts = os.path.normpath(os.path.abspath(folder)).split(os.sep)
+    if len(parts) >= 3 and parts[-2:] == ["SBtab","tsv"]:
+        return parts[-3]
+    return parts[-1]
+
+def _failed_build(folder,output,error):
+    """Helper function to get the result of a build that raised an error"""
+    return {"folder":folder,"output":output,"fingerprint":None,"status":"failed: "+repr(error),"missing":{},"errors":[],"exports":{}}
+
+def _build_quietly(folder,output,cache_folder,formats=("sbml",)):
+    """Helper function to run a build in a worker process, returning its result with the build log, time and profile"""
+    log = io.StringIO()
+    profiler = StageProfiler()
+    start = time.perf_counter()
+    with redirect_stdout(log):
+        try:
+            result = build_model(folder,output,cache_folder,profiler,formats)
+        except (Exception,SystemExit) as e: #e.g. tables in a layout the build does not understand, only this build fails
+            traceback.print_exc(file=log)
+            result = _failed_build(folder,output,e)
+    profiler.stop()
+    result["seconds"] = time.perf_counter()-start
+    result["log"] = log.getvalue()
+    result["profile"] = profiler.report()
+    return result
+
+def build_many(folders,output_folder="builds",workers=None,formats=("sbml",)):
+    """Function to build several SBtab folders at once in a process pool
+
+    Every folder is written to <output_folder>/<name>.xml, named by version_name, with its own build cache.
+
+        Arguments:
+            folders {list} -- SBtab folders to build
+
+        Keyword Arguments:
+            output_folder {str} -- folder the SBML files are written to (default: {"builds"})
+            workers {int} -- number of worker processes, defaults to the number of CPUs (default: {None})
+            formats {list} -- formats every model is exported to, see build_model (default: {("sbml",)})
+
+        Returns:
+            list -- results of build_model, in the order of the folders, each with its build log, time and profile
+    """
+    names = [version_name(folder) for folder in folders]
+    if len(set(names)) != len(names):
+        raise ValueError("Several folders would be built to the same file: "+", ".join(names))
+    os.makedirs(output_folder,exist_ok=True)
+    outputs = [os.path.join(output_folder,name+".xml") for name in names]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_build_quietly,folder,output,os.path.join(CACHE_FOLDER,"builds",name),formats) for folder,output,name in zip(folders,outputs,names)]
+        for folder,output,future in zip(folders,outputs,futures):
+            try:
+                results.append(future.result())
+            except Exception as e: #the worker itself failed, e.g. it was killed
+                result = _failed_build(folder,output,e)
+                result.update({"seconds":0.0,"log":"","profile":None})
+                results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the WormJam SBML model from the SBtab tables")
+    parser.add_argument("discord_endpoint",nargs="?",default=None,help="Discord webhook endpoint, passed from Travis-CI, failed builds are reported to it")
+    parser.add_argument("build_number",nargs="?",default=None,help="Travis build number, passed from Travis-CI")
+    parser.add_argument("--folders",nargs="+",default=[],help="SBtab folders or model_versions snapshots to build in parallel, instead of the curation folder")
+    parser.add_argument("--all-versions",action="store_true",help="build every snapshot in model_versions")
+    parser.add_argument("--output-folder",default="builds",help="folder the SBML of --folders and --all-versions builds is written to")
+    parser.add_argument("--workers",type=int,default=None,help="number of worker processes, defaults to the number of CPUs")
+    parser.add_argument("--profile",default=None,metavar="FILE",help="write the time and peak memory of every build stage to FILE as JSON")
+    parser.add_argument("--formats",nargs="+",choices=export.FORMATS,default=["sbml"],help="formats to export the model to in the same pass: SBML, gzip compressed SBML, cobra JSON and cobra MATLAB")
+    args = parser.parse_args()
+
+    if not args.folders and not args.all_versions:
+        profiler = StageProfiler()
+        result = build_model(profiler=profiler,formats=args.formats)
+        profiler.stop()
+        if args.profile is not None:
+            profiler.write(args.profile)
+        if result["status"] == "missing metabolites":
+            report_missing_metabolites(args.discord_endpoint,args.build_number,result["missing"])
+        elif result["status"] == "invalid tables":
+            report_invalid_tables(args.discord_endpoint,args.build_number,result["errors"])
+        if result["status"] not in ("built","up to date"):
+            exit(1)
     else:
-        attribs["{%s}"%NS_MAP["fbc"]+"lowerFluxBound"] = "ZERO_BOUND"
-    reaction_field = etree.SubElement(reaction_tree,"reaction",attrib=attribs)
-    notes_body = etree.SubElement(etree.SubElement(reaction_field,"notes"),"{%s}"%NS_MAP["xhtml"]+"body")
-    for i in [key2 for key2 in list(val.keys()) if all(block not in key2 for block in ["!Identifiers","!ReactionFormula"])]:
-        if val[i]!="":
-            etree.SubElement(notes_body,"{%s}"%NS_MAP["xhtml"]+"p").text=i.replace("!","").replace("Notes:","").replace("Pathway","Subsystem").upper() + ": " + val[i]
-
-
-    annotation_tree = etree.SubElement(etree.SubElement(etree.SubElement(reaction_field,"annotation"),"{%s}"%NS_MAP["rdf"]+"RDF"),"{%s}"%NS_MAP["rdf"]+"Description",attrib={"{%s}"%NS_MAP["rdf"]+"about":"#"+metaid})
-    gen_annotation_tree(annotation_tree, db_dict, val)
-
-    
-    genes = "("+val["!GeneAssociation"]+")"
-    parens = pyparsing.nestedExpr( '(', ')', content=pyparsing.Word(pyparsing.alphanums) | ' or ' | " and " )
-    r = parens.parseString(genes)[0].asList()
-    er = deepcopy(r)
-    try:
-        parse(reaction_field,r)
-    except Exception as e:
-        print(key,er)
-        print(e)
-    
-    reactants,products = react_proc(val["!ReactionFormula"])
-    if "" not in reactants:
-        listOfReactants = etree.SubElement(reaction_field,"listOfReactants")
-        for key2,val2 in reactants.items():
-            etree.SubElement(listOfReactants,"speciesReference",attrib={"constant":"true","species":key2,"stoichiometry":val2})
-    if "" not in products:       
-        listOfProducts = etree.SubElement(reaction_field,"listOfProducts")
-        for key2,val2 in products.items():
-            etree.SubElement(listOfProducts,"speciesReference",attrib={"constant":"true","species":key2,"stoichiometry":val2})
-
-
-
-######################
-######################
-## 
-## Output
-##
-######################
-######################
-if BUILD:
-    output_model.write(etree.tostring(sbml,encoding="UTF-8",standalone=False,xml_declaration=True,pretty_print=True))
-    output_model.close()
\ No newline at end of file
+        folders = [resolve_folder(name) for name in args.folders]
+        if args.all_versions:
+            folders += version_folders()
+        try:
+            results = build_many(folders,args.output_folder,args.workers,args.formats)
+        except ValueError as e:
+            print(e)
+            exit(1)
+        for result in results:
+            print("%s -> %s: %s (%.2fs)"%(os.path.relpath(result["folder"]),result["output"],result["status"],result["seconds"]))
+            if result["status"] == "missing metabolites":
+                print("   ",len(result["missing"]),"reactions with metabolites missing from the Compound table")
+            elif result["status"] == "invalid tables":
+                print("   ",len(result["errors"]),"validation errors, see python travis/validation.py",os.path.relpath(result["folder"]))
+            elif result["status"] == "missing tables":
+                print("    missing tables:",", ".join(result["missing"][result["folder"]]))
+        if args.profile is not None:
+            with open(args.profile,"w") as f:
+                json.dump({result["output"]:result["profile"] for result in results},f,indent=4)
+        if any(result["status"] not in ("built","up to date") for result in results):
+            exit(1)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""Validation of the curation tables
+
+Checks the tables for problems that break the build or the SBML (errors) and for curation issues (warnings),
+in a single pass over every table using the cross-reference indexes of ModelSystem. Every finding is a
+dictionary of rule, severity, table, id, message and values (the offending metabolites, genes...).
+
+Usage:
+    python travis/validation.py
+    python travis/validation.py curation --json validation.json --show 0
+    python travis/validation.py --rules missing_metabolite unknown_gene
+"""
+import argparse
+import json
+import time
+
+import gpr
+
+ERROR = "error"
+WARNING = "warning"
+ENTITY_TABLES = ["Compartment","Compound","Reaction","Gene","Pathway"] #tables whose IDs must be unique
+
+# rule:(severity,description)
+RULES = {
+    "duplicate_id":(WARNING,"ID used by more than one entry, only the last one is built"),
+    "formula_syntax":(ERROR,"reaction formula without exactly one <=>"),
+    "missing_metabolite":(ERROR,"metabolite of a reaction missing from the Compound table"),
+    "stoichiometry":(ERROR,"stoichiometry that is not a number"),
+    "empty_reaction":(WARNING,"reaction formula without any metabolites"),
+    "reversibility":(WARNING,"!IsReversible other than TRUE or FALSE"),
+    "gene_association":(WARNING,"gene association that cannot be parsed, built without genes"),
+    "unknown_gene":(WARNING,"gene of a gene association missing from the Gene table"),
+    "unknown_pathway":(WARNING,"pathway of a reaction missing from the Pathway table"),
+    "unknown_compartment":(ERROR,"location of a compound missing from the Compartment table"),
+    "charge":(WARNING,"charge that is not a whole number"),
+    "unused_metabolite":(WARNING,"compound not used by any reaction"),
+    "empty_pathway":(WARNING,"pathway without any reactions"),
+    "mass_balance":(WARNING,"reaction whose elements do not balance, see balance.py"),
+    "charge_balance":(WARNING,"reaction whose charges do not balance, see balance.py"),
+}
+
+
+def finding(rule,table,key,message,values=[]):
+    """Function to create a finding of a rule"""
+    return {"rule":rule,"severity":RULES[rule][0],"table":table,"id":key,"message":message,"values":list(values)}
+
+def rules_of(severity):
+    """Function to list the rules of a severity"""
+    return [rule for rule,(rule_severity,description) in RULES.items() if rule_severity == severity]
+
+def _is_number(value):
+    """Helper function to check whether a string is a number"""
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+
+class Validator():
+    """Class for checking a ModelSystem against all validation rules at once
+
+        Arguments:
+            model {ModelSystem} -- model with at least the Reaction and Compound tables loaded
+    """
+
+    def __init__(self,model):
+        """Initialization function"""
+        self.model = model
+        self.tables = model.tables
+
+    def run(self,rules=None):
+        """Function to check the model
+
+            Keyword Arguments:
+                rules {list} -- names of the rules to check, defaults to all of RULES (default: {None})
+
+            Returns:
+                list -- findings, table by table
+        """
+        enabled = set(RULES) if rules is None else set(rules)
+        unknown = enabled-set(RULES)
+        if unknown:
+            raise ValueError("Unknown validation rules: "+", ".join(sorted(unknown)))
+        findings = []
+        if "duplicate_id" in enabled:
+            for name in ENTITY_TABLES:
+                if name in self.tables:
+                    findings.extend(finding("duplicate_id",name,key,"%s is used by more than one entry"%key) for key in self.tables[name].duplicates)
+        findings.extend(self._check_reactions(enabled))
+        findings.extend(self._check_compounds(enabled))
+        findings.extend(self._check_pathways(enabled))
+        findings.extend(self._check_balance(enabled))
+        return findings
+
+    def _check_reactions(self,enabled):
+        """Function to check every rule on the Reaction table in one pass"""
+        index = self.model.index
+        compounds = self.tables["Compound"].data
+        genes = self.tables["Gene"].data if "Gene" in self.tables else None
+        pathways = self.tables["Pathway"].data if "Pathway" in self.tables else None
+        reversible = self.tables["Reaction"].column("!IsReversible")
+        rules = self.tables["Reaction"].column("!GeneAssociation")
+        for key,pathway in self.tables["Reaction"].column("!Pathway").items():
+            if key in index.invalid_formulas:
+                if "formula_syntax" in enabled:
+                    yield finding("formula_syntax","Reaction",key,"cannot parse the formula "+repr(index.invalid_formulas[key]))
+            else:
+                reactants,products = index.reaction_formulas[key]
+                if "missing_metabolite" in enabled:
+                    absent = [met for met in index.reaction_metabolites[key] if met not in compounds]
+                    if absent and absent != ['']: #a lone blank is an empty side of the reaction, e.g. exchanges
+                        yield finding("missing_metabolite","Reaction",key,"metabolites missing from the Compound table",absent)
+                if "stoichiometry" in enabled:
+                    invalid = [met for side in (reactants,products) for met,coefficient in side.items() if not _is_number(coefficient)]
+                    if invalid:
+                        yield finding("stoichiometry","Reaction",key,"stoichiometry is not a number",invalid)
+                if "empty_reaction" in enabled and "" in reactants and "" in products:
+                    yield finding("empty_reaction","Reaction",key,"the formula has no metabolites")
+            if "reversibility" in enabled and reversible[key].lower() not in ("true","false"):
+                yield finding("reversibility","Reaction",key,"!IsReversible is %r"%reversible[key])
+            if "gene_association" in enabled:
+                try:
+                    gpr.parse_gpr(rules[key])
+                except ValueError as e:
+                    yield finding("gene_association","Reaction",key,str(e))
+            if "unknown_gene" in enabled and genes is not None:
+                absent = [gene for gene in index.genes_of_reaction(key) if gene not in genes]
+                if absent:
+                    yield finding("unknown_gene","Reaction",key,"genes missing from the Gene table",absent)
+            if "unknown_pathway" in enabled and pathways is not None and pathway != "" and pathway not in pathways:
+                yield finding("unknown_pathway","Reaction",key,"pathway missing from the Pathway table",[pathway])
+
+    def _check_compounds(self,enabled):
+        """Function to check every rule on the Compound table in one pass"""
+        index = self.model.index
+        compartments = self.tables["Compartment"].data if "Compartment" in self.tables else None
+        charges = self.tables["Compound"].column("!Charge") if "!Charge" in self.tables["Compound"].headers else {}
+        for key,location in self.tables["Compound"].column("!Location").items():
+            if "unknown_compartment" in enabled and compartments is not None and location not in compartments:
+                yield finding("unknown_compartment","Compound",key,"compartment %r is missing from the Compartment table"%location,[location])
+            charge = charges.get(key,"").strip()
+            if "charge" in enabled and charge != "" and not (_is_number(charge) and float(charge).is_integer()):
+                yield finding("charge","Compound",key,"charge %r is not a whole number"%charge,[charge])
+            if "unused_metabolite" in enabled and not index.reactions_of_metabolite(key):
+                yield finding("unused_metabolite","Compound",key,"not used by any reaction")
+
+    def _check_pathways(self,enabled):
+        """Function to check every rule on the Pathway table in one pass"""
+        if "empty_pathway" not in enabled or "Pathway" not in self.tables:
+            return
+        for key in self.tables["Pathway"].data:
+            if not self.model.index.reactions_in_pathway(key):
+                yield finding("empty_pathway","Pathway",key,"no reaction is in this pathway")
+
+    def _check_balance(self,enabled):
+        """Function to check the mass and charge balance of every reaction at once"""
+        if "mass_balance" not in enabled and "charge_balance" not in enabled:
+            return
+        from balance import Balance,format_imbalance #numpy and scipy are only needed for these rules
+        balance = Balance(self.model)
+        if "mass_balance" in enabled:
+            for key,counts in balance.mass_imbalanced().items():
+                yield finding("mass_balance","Reaction",key,"net atoms made",format_imbalance(counts).split(" "))
+        if "charge_balance" in enabled:
+            for key,charge in balance.charge_imbalanced().items():
+                yield finding("charge_balance","Reaction",key,"net charge made",["%+g"%charge])
+
+
+def errors(findings):
+    """Function to get the findings that break the build"""
+    return [item for item in findings if item["severity"] == ERROR]
+
+def summarise(findings,show=10):
+    """Function to print the number of findings of every rule, and the first few of each"""
+    by_rule = {}
+    for item in findings:
+        by_rule.setdefault(item["rule"],[]).append(item)
+    for rule,items in by_rule.items():
+        severity,description = RULES[rule]
+        print("%s %s: %d (%s)"%(severity.upper(),rule,len(items),description))
+        for item in items[:show]:
+            print("    %s %s: %s%s"%(item["table"],item["id"],item["message"],(" - "+", ".join(item["values"])) if item["values"] else ""))
+        if len(items) > show > 0:
+            print("    ... and",len(items)-show,"more")
+
+
+if __name__ == "__main__":
+    from helper_classes import load_quietly
+
+    parser = argparse.ArgumentParser(description="Validate the WormJam SBtab tables")
+    parser.add_argument("folder",nargs="?",default="curation",help="SBtab folder to validate")
+    parser.add_argument("--rules",nargs="+",default=None,choices=sorted(RULES),help="rules to check (default: all)")
+    parser.add_argument("--show",type=int,default=10,help="findings listed per rule")
+    parser.add_argument("--json",default=None,metavar="FILE",help="write every finding to FILE")
+    args = parser.parse_args()
+
+    compiler = load_quietly(args.folder)
+    start = time.perf_counter()
+    findings = Validator(compiler).run(args.rules)
+    seconds = time.perf_counter()-start
+    summarise(findings,args.show)
+    print("%d findings, %d errors in %.3fs"%(len(findings),len(errors(findings)),seconds))
+    if args.json is not None:
+        with open(args.json,"w") as f:
+            json.dump(findings,f,indent=4)
+    if errors(findings):
+        exit(1)